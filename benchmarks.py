@@ -0,0 +1,425 @@
+'''Benchmarks for reading list storage, search result parsing & rendering.
+
+Run `python benchmarks.py` to print a table of results, `--json results.json` to also save them in a
+machine-readable form, & `--compare results.json` to show how each result has changed since that file
+was saved. All data is synthetic & generated the same way on every run, so results from different commits
+can be compared directly.
+'''
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from main import (MAX_PAGE_SIZE, PAGE_SIZE, Book, BookIndex, BookList, File, JournalStore, JsonStore,
+                  ListCatalog, ListView, Search, SortIndex, SqliteStore, display_books, list_all_lists)
+
+SIZES = (10, 1000, 100000)
+STORES = (JsonStore, JournalStore, SqliteStore)
+STARTUP_BUDGET_MS = 40
+DEFERRED_MODULES = ('requests', 'urllib3', 'charset_normalizer', 'idna', 'certifi', 'sqlite3', 'concurrent', 'cProfile')
+
+
+class DictBook:
+    '''Book stored with an instance dictionary, as Book was before it gained __slots__.'''
+    def __init__(self, id, title, author, publisher):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.publisher = publisher
+
+
+# These functions generate synthetic data.
+
+def make_books(count, prefix='book'):
+    '''Return synthetic Book objects with unique IDs.'''
+    return [
+        Book(f'{prefix}{i}', f'Title {i}', f'Author {i % 500}', f'Publisher {i % 50}')
+        for i in range(count)
+    ]
+
+def make_records(count):
+    '''Return synthetic book details as freshly decoded strings, as they would be read from a file.'''
+    return [
+        json.loads(json.dumps([f'book{i}', f'Title {i}', f'Author {i % 500}', f'Publisher {i % 50}']))
+        for i in range(count)
+    ]
+
+def make_volume(i):
+    '''Return a volume resource with the fields the Books API returns when no fields are requested.'''
+    id = f'vol{i:08d}'
+    link = f'http://books.google.com/books?id={id}'
+    return {
+        'kind': 'books#volume',
+        'id': id,
+        'etag': f'etag{i:012d}',
+        'selfLink': f'https://www.googleapis.com/books/v1/volumes/{id}',
+        'volumeInfo': {
+            'title': f'Title {i}',
+            'subtitle': f'A Subtitle for Book {i}',
+            'authors': [f'Author {i % 500}', f'Second Author {i % 97}'],
+            'publisher': f'Publisher {i % 50}',
+            'publishedDate': f'{1950 + i % 70}-0{1 + i % 9}-1{i % 10}',
+            'description': ' '.join(f'Sentence {n} describing book {i} at some length.' for n in range(12)),
+            'industryIdentifiers': [
+                {'type': 'ISBN_10', 'identifier': f'{i:010d}'},
+                {'type': 'ISBN_13', 'identifier': f'978{i:010d}'},
+            ],
+            'readingModes': {'text': True, 'image': False},
+            'pageCount': 200 + i % 400,
+            'printType': 'BOOK',
+            'categories': ['Fiction'],
+            'averageRating': 4,
+            'ratingsCount': i % 100,
+            'maturityRating': 'NOT_MATURE',
+            'allowAnonLogging': False,
+            'contentVersion': '1.2.3.0.preview.2',
+            'panelizationSummary': {'containsEpubBubbles': False, 'containsImageBubbles': False},
+            'imageLinks': {
+                'smallThumbnail': f'{link}&printsec=frontcover&img=1&zoom=5&source=gbs_api',
+                'thumbnail': f'{link}&printsec=frontcover&img=1&zoom=1&source=gbs_api',
+            },
+            'language': 'en',
+            'previewLink': f'{link}&printsec=frontcover&dq=python&hl=&cd=1&source=gbs_api',
+            'infoLink': f'{link}&dq=python&hl=&source=gbs_api',
+            'canonicalVolumeLink': f'https://books.google.com/books/about/Title_{i}.html?hl=&id={id}',
+        },
+        'saleInfo': {'country': 'US', 'saleability': 'NOT_FOR_SALE', 'isEbook': False},
+        'accessInfo': {
+            'country': 'US', 'viewability': 'PARTIAL', 'embeddable': True, 'publicDomain': False,
+            'textToSpeechPermission': 'ALLOWED', 'epub': {'isAvailable': False},
+            'pdf': {'isAvailable': False}, 'webReaderLink': f'http://play.google.com/books/reader?id={id}',
+            'accessViewStatus': 'SAMPLE', 'quoteSharingAllowed': False,
+        },
+        'searchInfo': {'textSnippet': f'A short snippet from book {i} matching the query.'},
+    }
+
+def make_page(page_size=MAX_PAGE_SIZE, fields=False, start=0):
+    '''Return the body of one page of search results as it would be sent by the API.
+
+    :param fields: Whether the request asked for only the fields displayed, as Search does.
+    :type fields: boolean
+    :return: Response body.
+    :rtype: bytes
+    '''
+    items = [make_volume(i) for i in range(start, start + page_size)]
+    if fields:
+        keep = ['title', 'authors', 'publisher', 'imageLinks']
+        items = [{'id': item['id'], 'volumeInfo': {key: item['volumeInfo'][key] for key in keep}} for item in items]
+    return json.dumps({'kind': 'books#volumes', 'totalItems': 1000, 'items': items}).encode()
+
+@contextlib.contextmanager
+def list_store(store_class, size, lists=10):
+    '''Install a store holding a "bench" list of size books & some other empty lists as File.store.'''
+    with tempfile.TemporaryDirectory() as directory:
+        if store_class is SqliteStore:
+            store = SqliteStore(os.path.join(directory, 'books.db'), directory)
+        else:
+            store = store_class(directory)
+        for i in range(lists):
+            store.create(f'other {i}')
+        store.create('bench')
+        store.save_many('bench', make_books(size))
+
+        saved = (File.store, File.catalog, File.sort_index)
+        File.store = store
+        File.catalog = ListCatalog()
+        File.sort_index = SortIndex()
+        try:
+            yield store
+        finally:
+            (File.store, File.catalog, File.sort_index) = saved
+            if store_class is SqliteStore:
+                store.close()
+
+
+# These functions measure & record results.
+
+def timed(function, repeat=5):
+    '''Run function repeat times, passing it the run number.
+
+    :return: Median & fastest duration in milliseconds.
+    :rtype: dict
+    '''
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(i)
+        durations.append((time.perf_counter() - start) * 1000)
+    return {'median_ms': statistics.median(durations), 'min_ms': min(durations), 'repeat': repeat}
+
+def measured(function):
+    '''Run function & return memory still allocated by its result in megabytes.'''
+    tracemalloc.start()
+    result = function()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size / 1024 / 1024
+
+def interpreter(*args):
+    '''Run Python in a new interpreter in this directory & return the finished process.
+
+    Bytecode is always cached, so repeated runs measure starting from cached bytecode as an installed app 
+    would rather than compiling main.py every time.
+    '''
+    env = {key: value for (key, value) in os.environ.items() if key != 'PYTHONDONTWRITEBYTECODE'}
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, check=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def import_times(module='main'):
+    '''Import module in a new interpreter with -X importtime.
+
+    :return: Self & cumulative import time in microseconds of each module imported, keyed by module name.
+    :rtype: dict
+    '''
+    process = interpreter('-X', 'importtime', '-c', f'import {module}')
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        (own, cumulative, name) = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own), int(cumulative))
+    return times
+
+def imported_modules(module='main'):
+    '''Return names of modules imported by importing module in a new interpreter, after its own startup.'''
+    code = f'import sys; before = set(sys.modules); import {module}; print(*sorted(set(sys.modules) - before))'
+    return interpreter('-c', code).stdout.split()
+
+def result(name, values, **params):
+    '''Return one benchmark result as a record of its name, parameters & measured values.'''
+    return {'name': name, 'params': params, **values}
+
+def result_key(record):
+    '''Return key identifying a result across runs.'''
+    params = ', '.join(f'{key}={value}' for (key, value) in sorted(record['params'].items()))
+    return f"{record['name']} ({params})" if params else record['name']
+
+
+# These functions are the benchmarks. Each returns a list of results.
+
+def bench_file(sizes=SIZES, repeat=5):
+    '''Time File operations on a list of each size in each store.'''
+    results = []
+    for store_class in STORES:
+        for size in sizes:
+            with list_store(store_class, size):
+                file = File('bench')
+                extra = make_books(repeat, 'new')
+                params = {'store': store_class.__name__, 'size': size}
+                results += [
+                    result('File.load', timed(lambda i: file.load(), repeat), **params),
+                    result('File.save', timed(lambda i: file.save(extra[i]), repeat), **params),
+                    result('File.save duplicate', timed(lambda i: file.save(extra[i]), repeat), **params),
+                    result('File.delete_record', timed(lambda i: file.delete_record(extra[i]), repeat), **params),
+                    result('File.list_contains_dupe', timed(lambda i: file.list_contains_dupe(f'book{size // 2}'), repeat), **params),
+                ]
+    return results
+
+def bench_views(sizes=SIZES, repeat=5):
+    '''Time showing a middle page of a list of each size sorted by title & filtered, saving a book to a 
+    list that has sort keys, & reading sort keys saved by an earlier session.'''
+    results = []
+    for size in sizes:
+        with list_store(JsonStore, size):
+            file = File('bench')
+            extra = make_books(repeat, 'new')
+            middle = size // 2
+            title = ListView('title')
+            params = {'store': 'JsonStore', 'size': size}
+            results.append(result('sorted page first view', timed(lambda i: SortIndex().page('bench', title, middle), 1), **params))
+            file.load_view(title)
+            results += [
+                result('sorted page', timed(lambda i: file.load_view(title, middle), repeat), **params),
+                result('unsorted page', timed(lambda i: file.load_view(ListView(), middle), repeat), **params),
+                result('filtered page', timed(lambda i: file.load_view(ListView('title', 'author', 'author 49', True)), repeat), **params),
+                result('File.save with sort keys', timed(lambda i: file.save(extra[i]), repeat), **params),
+            ]
+            File.sort_index.write()
+            results.append(result('sort keys read', timed(lambda i: SortIndex().get('bench'), repeat), **params))
+    return results
+
+def bench_lists(sizes=SIZES, repeat=5):
+    '''Time listing 100 reading lists with an empty catalog & with a filled one.'''
+    results = []
+    for store_class in STORES:
+        with list_store(store_class, 10, lists=99):
+            params = {'store': store_class.__name__, 'lists': 100}
+            results.append(result('list_all_lists cold', timed(lambda i: ListCatalog().names(), repeat), **params))
+            results.append(result('list_all_lists', timed(lambda i: list_all_lists(), repeat), **params))
+    return results
+
+def bench_render(sizes=SIZES, repeat=5):
+    '''Time printing a page of books & a whole list of each size.'''
+    results = []
+    for size in (PAGE_SIZE,) + tuple(sizes):
+        books = BookList(make_books(size))
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(result('display_books', timed(lambda i: display_books(books), repeat), size=size))
+    return results
+
+def bench_payload(sizes=SIZES, repeat=50):
+    '''Compare a page of full volume resources with a page requested with fields & gzip, as Search does.
+
+    Records bytes in the response body, bytes transferred when gzipped & time to decompress & decode
+    body & format results, as well as time to format results alone.
+    '''
+    search = Search()
+    results = []
+    for (response, fields) in [('full', False), ('fields', True)]:
+        body = make_page(MAX_PAGE_SIZE, fields)
+        compressed = gzip.compress(body)
+        data = json.loads(body)
+        parse = timed(lambda i: search.format_search_results(json.loads(gzip.decompress(compressed))), repeat)
+        results.append(result('search page', {**parse, 'bytes': len(body), 'gzip_bytes': len(compressed)}, response=response))
+        results.append(result('format_search_results', timed(lambda i: search.format_search_results(data), repeat), response=response))
+    return results
+
+def bench_index(sizes=SIZES, repeat=5, queries=('title 12345', 'author 123', 'title 99', 'publisher 7')):
+    '''Time building a search index over the largest list size & running queries against it.'''
+    size = max(sizes)
+    books = make_books(size)
+
+    def build(i):
+        index = BookIndex()
+        index.built = True
+        for book in books:
+            index.add('Bench', book)
+        return index
+
+    results = [result('BookIndex build', timed(build, 1), size=size)]
+    index = build(0)
+    for query in queries:
+        results.append(result('BookIndex.search', timed(lambda i: index.search(query), repeat), size=size, query=query))
+    return results
+
+def bench_memory(sizes=SIZES, repeat=1):
+    '''Measure memory used by the largest list as dict-backed objects, slotted Books & a BookList.'''
+    size = max(sizes)
+
+    def booklist():
+        books = BookList()
+        for record in make_records(size):
+            books.add(*record)
+        return books
+
+    return [
+        result('memory', {'mb': measured(lambda: [DictBook(*record) for record in make_records(size)])}, size=size, type='dict objects'),
+        result('memory', {'mb': measured(lambda: [Book(*record) for record in make_records(size)])}, size=size, type='slotted Books'),
+        result('memory', {'mb': measured(booklist)}, size=size, type='BookList'),
+    ]
+
+def bench_startup(sizes=SIZES, repeat=5):
+    '''Time importing main in a new interpreter, as measured by -X importtime, & starting the batch CLI.
+
+    Modules imported by the interpreter itself before main, such as site, are not included in the import 
+    time, so it measures only the cost of main & the modules it imports.
+    '''
+    modules = imported_modules()
+    durations = [import_times()['main'][1] / 1000 for i in range(repeat)]
+    startup = {'median_ms': statistics.median(durations), 'min_ms': min(durations), 'repeat': repeat, 'modules': len(modules)}
+    return [
+        result('import main', startup),
+        result('main.py --help', timed(lambda i: interpreter('main.py', '--help'), repeat)),
+    ]
+
+BENCHMARKS = {
+    'file': bench_file,
+    'lists': bench_lists,
+    'views': bench_views,
+    'render': bench_render,
+    'payload': bench_payload,
+    'index': bench_index,
+    'memory': bench_memory,
+    'startup': bench_startup,
+}
+
+
+# These functions run the benchmarks & report results.
+
+def environment():
+    '''Return details of the machine & commit results were measured on.'''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+def run(names=None, sizes=SIZES, repeat=5):
+    '''Run named benchmarks, or all benchmarks.
+
+    :return: Environment details & list of results.
+    :rtype: dict
+    '''
+    results = []
+    for name in names or BENCHMARKS:
+        if name == 'payload':
+            results += bench_payload(sizes, max(repeat, 50))
+        else:
+            results += BENCHMARKS[name](sizes, repeat)
+    return {'environment': environment(), 'results': results}
+
+def describe(record):
+    '''Format measured values of a result for printing.'''
+    if 'median_ms' in record:
+        text = f"{record['median_ms']:>10.3f} ms"
+    else:
+        text = f"{record['mb']:>10.1f} MB"
+    if 'modules' in record:
+        text += f"  {record['modules']} modules"
+    if 'bytes' in record:
+        text += f"  {record['bytes']} bytes, {record['gzip_bytes']} gzipped"
+    return text
+
+def compare(report, baseline):
+    '''Print each result alongside the matching result in baseline & the ratio between them.'''
+    previous = {result_key(record): record for record in baseline['results']}
+    environment = baseline['environment']
+    print(f"\nCompared with {environment.get('commit')} ({environment.get('time')})")
+    for record in report['results']:
+        key = result_key(record)
+        metric = 'median_ms' if 'median_ms' in record else 'mb'
+        old = previous.get(key, {}).get(metric)
+        change = f'{record[metric] / old:>6.2f}x' if old else '   new'
+        print(f'{key:<70} {old or 0:>10.3f} -> {record[metric]:>10.3f} {change}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark reading list storage, search parsing & rendering.')
+    parser.add_argument('benchmarks', nargs='*', help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help='list sizes in books')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of each timed operation')
+    parser.add_argument('--json', help='file to save results to, or - for stdout')
+    parser.add_argument('--compare', help='results file from an earlier run to compare with')
+    args = parser.parse_args()
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    report = run(args.benchmarks, args.sizes, args.repeat)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        for record in report['results']:
+            print(f'{result_key(record):<70} {describe(record)}')
+        if args.json:
+            with open(args.json, 'w') as file:
+                json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
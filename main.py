@@ -1,19 +1,104 @@
+import argparse
+import bisect
+import collections
+import functools
+import heapq
+import itertools
 import json
-import requests
 import math
 import os
+import sys
 import time
 import re
+import tempfile
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+API_URL = 'https://www.googleapis.com/books/v1/volumes'
+API_FIELDS = 'totalItems,items(id,volumeInfo(title,authors,publisher,imageLinks(smallThumbnail,thumbnail)))'
+USER_AGENT = 'books-cli (gzip)'
+LISTS_DIR = 'lists'
+DATABASE = 'books.db'
+PROFILE = os.environ.get('BOOKS_PROFILE', '')
+JOURNAL_LIMIT = 1000
+CACHE_DIR = '.cache'
+CACHE_TTL = 60 * 60
+CACHE_SIZE = 200
+COVER_DIR = f'{CACHE_DIR}/covers'
+COVER_CACHE_SIZE = 50 * 1024 * 1024
+COVER_WORKERS = 4
+PAGE_SIZE = 5
+MAX_PAGE_SIZE = 40
+API_TIMEOUT = (3.05, 10)
+API_RETRIES = 3
+SEARCH_DEADLINE = 20
+API_RATE = 10
+BATCH_SIZE = 500
+SEARCH_LIMIT = 40
+
+# These functions read settings from environment variables. An invalid value stops the app with a message 
+# naming the variable, rather than a traceback from deep inside the module.
+
+def storage(value):
+    '''Check name of list store.'''
+    if value not in ['json', 'journal', 'sqlite']:
+        raise ValueError(value)
+    return value
+
+def seconds(value):
+    '''Convert value to a number of seconds, which may not be negative.'''
+    number = float(value)
+    if not number >= 0:
+        raise ValueError(value)
+    return number
+
+def page_size(value):
+    '''Convert value to a number of books per page, which is capped at MAX_PAGE_SIZE.'''
+    size = int(value)
+    if size < 1:
+        raise ValueError(value)
+    return min(size, MAX_PAGE_SIZE)
+
+def env_setting(name, default, parse, expected):
+    '''Read setting from environment variable, exiting with an error message if its value is invalid.
+
+    :param name: Environment variable.
+    :type name: str
+    :param parse: Function converting value, raising ValueError if value is invalid.
+    :type parse: function
+    :param expected: Description of valid values, for error message.
+    :type expected: str
+    :return: Converted value, or default if variable is unset or empty.
+    :rtype: any
+    '''
+    value = os.environ.get(name, '')
+    if not value:
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        sys.exit(f"main.py: invalid {name} '{value}': expected {expected}")
+
+STORAGE = env_setting('BOOKS_STORAGE', 'json', storage, 'json, journal or sqlite')
+PAUSE = env_setting('BOOKS_PAUSE', None, seconds, 'a number of seconds')
+BOOKS_PER_PAGE = env_setting('BOOKS_PAGE_SIZE', PAGE_SIZE, page_size, 'a whole number of books')
 
 # These classes store data.
 
 class Book:
-    '''This class handles book items.'''
-    def __init__(self, id, title, author, publisher):
+    '''This class handles book items. The thumbnail is the URL of the book's cover image, if it has one.'''
+    __slots__ = ('id', 'title', 'author', 'publisher', 'thumbnail')
+
+    def __init__(self, id, title, author, publisher, thumbnail=''):
         self.id = id
         self.title = title
         self.author = author
         self.publisher = publisher
+        self.thumbnail = thumbnail
 
     def __repr__(self):
         '''Print book details as a string.'''
@@ -24,28 +109,1548 @@ class Book:
         title = style_output(self.title, 'title')
         print(f"    Title: {title}\n    Author(s): {self.author}\n    Publisher: {self.publisher}")
 
-class File:  
-    '''This class handles JSON files.'''
-    def __init__(self, name):
-        self.name = f"{name.replace('_', ' ').title()}"
-        self.filename = f"lists/{name.replace(' ', '_')}.json"   
+    def to_dict(self):
+        '''Return book details as a dictionary for saving as JSON. Thumbnail is left out if book has none.'''
+        book = {'id': self.id, 'title': self.title, 'author': self.author, 'publisher': self.publisher}
+        if self.thumbnail:
+            book['thumbnail'] = self.thumbnail
+        return book
 
-    def load(self):
-        '''Load reading list & format JSON strings as a list of Book instances.'''
-        with open(self.filename) as file:
+    @classmethod
+    def from_dict(cls, book):
+        '''Return book read from a dictionary saved by to_dict.'''
+        return cls(book['id'], book['title'], book['author'], book['publisher'], book.get('thumbnail', ''))
+
+class BookList:
+    '''This class stores a list of books as parallel columns of IDs, titles, authors, publishers & thumbnails.
+
+    Storing columns instead of one object per book keeps very large reading lists small in memory, and 
+    author & publisher names are interned so books sharing an author share one string. Book objects are 
+    created only when the list is indexed or iterated.
+    '''
+    __slots__ = ('ids', 'titles', 'authors', 'publishers', 'thumbnails')
+
+    def __init__(self, books=()):
+        self.ids = []
+        self.titles = []
+        self.authors = []
+        self.publishers = []
+        self.thumbnails = []
+        for book in books:
+            self.append(book)
+
+    def add(self, id, title, author, publisher, thumbnail=''):
+        '''Add book details to end of list without creating a Book.'''
+        self.ids.append(id)
+        self.titles.append(title)
+        self.authors.append(sys.intern(author))
+        self.publishers.append(sys.intern(publisher))
+        self.thumbnails.append(thumbnail)
+
+    def append(self, book):
+        '''Add book to end of list.'''
+        self.add(book.id, book.title, book.author, book.publisher, book.thumbnail)
+
+    def add_dict(self, book):
+        '''Add book read from a dictionary saved by Book.to_dict without creating a Book.'''
+        self.add(book['id'], book['title'], book['author'], book['publisher'], book.get('thumbnail', ''))
+
+    def row(self, i):
+        '''Return details of book at index i in the order Book takes them.'''
+        return (self.ids[i], self.titles[i], self.authors[i], self.publishers[i], self.thumbnails[i])
+
+    def without(self, ids):
+        '''Return new list containing only books whose IDs are not in ids.'''
+        books = BookList()
+        for (i, id) in enumerate(self.ids):
+            if id not in ids:
+                books.add(*self.row(i))
+        return books
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            books = BookList()
+            for i in range(*index.indices(len(self))):
+                books.add(*self.row(i))
+            return books
+        return Book(*self.row(index))
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield Book(*self.row(i))
+
+    def __eq__(self, other):
+        if not isinstance(other, (BookList, list)):
+            return NotImplemented
+        return [book.to_dict() for book in self] == [book.to_dict() for book in other]
+
+    def __repr__(self):
+        return repr(list(self))
+
+class JsonStore:
+    '''This class stores each reading list as a JSON file in the lists directory.
+
+    The IDs of books in each list are kept in memory after a list is first read, so duplicate checks don't 
+    re-read the file. The ID index is rebuilt if the file has been changed by another process.
+
+    Every change is made while holding an advisory lock on the list & files are replaced atomically, so 
+    several processes can edit the same list without losing or corrupting books. Changes to several files 
+    are recorded in a commit file first, so a change interrupted by a crash is completed on next use.
+    '''
+    shared_version = False
+
+    def __init__(self, directory=LISTS_DIR):
+        self.directory = directory
+        self.ids = {}
+        self.locks = {}
+        self.thread_lock = threading.RLock()
+        self.recovered = False
+
+    def path(self, name):
+        '''Return path of JSON file for named list.'''
+        return f"{self.directory}/{name.replace(' ', '_')}.json"
+
+    def lock_path(self, name):
+        '''Return path of lock file for named list.'''
+        return f"{self.directory}/.{name.replace(' ', '_')}.lock"
+
+    def catalog_path(self):
+        '''Return path of file rewritten whenever a list is created or deleted.'''
+        return f"{self.directory}/.catalog"
+
+    @contextmanager
+    def locked(self, *names):
+        '''Hold exclusive locks on named lists for the duration of a with block.
+
+        Locks are acquired in sorted order so two processes moving books in opposite directions can't 
+        deadlock. Locks are reentrant within a process, so locked operations can call each other.
+        '''
+        self.recover()
+        paths = sorted({self.lock_path(name) for name in names})
+        with self.thread_lock:
+            acquired = []
+            try:
+                for path in paths:
+                    self.acquire(path)
+                    acquired.append(path)
+                yield
+            finally:
+                for path in reversed(acquired):
+                    self.release(path)
+
+    def acquire(self, path):
+        '''Acquire lock file, or increase hold count if this process already holds it.'''
+        held = self.locks.get(path)
+        if held:
+            held[1] += 1
+            return
+        file = open(path, 'a')
+        if fcntl:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        self.locks[path] = [file, 1]
+
+    def release(self, path):
+        '''Decrease hold count of lock file & release it once it is no longer held.'''
+        held = self.locks[path]
+        held[1] -= 1
+        if held[1] == 0:
+            del self.locks[path]
+            if fcntl:
+                fcntl.flock(held[0], fcntl.LOCK_UN)
+            held[0].close()
+
+    def signature(self, path):
+        '''Return file details that change whenever file is rewritten.'''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def cached_ids(self, path):
+        '''Return indexed book IDs for file, or None if file has changed since it was indexed.'''
+        cached = self.ids.get(path)
+        if cached and cached[0] == self.signature(path):
+            return cached[1]
+        return None
+
+    def remember(self, path, ids):
+        '''Store book IDs for file as of its current version.'''
+        self.ids[path] = (self.signature(path), ids)
+
+    def index(self, name):
+        '''Return set of IDs of books in reading list, reading file only if it is not indexed.'''
+        path = self.path(name)
+        ids = self.cached_ids(path)
+        if ids is None:
+            ids = set(self.load(name).ids)
+            self.remember(path, ids)
+        return ids
+
+    def commit(self, names, changes, truncate=()):
+        '''Replace several files as a single change. Caller must hold locks on all named lists.
+
+        New contents are written to temporary files, and the renames & truncations needed to install them 
+        are recorded in a commit file before any are performed. If the process dies part way through, the 
+        next store to use the directory performs the remaining steps.
+
+        :param names: Names of lists being changed.
+        :type names: list
+        :param changes: New file contents keyed by path.
+        :type changes: dict
+        :param truncate: Paths of files to empty once new contents are installed.
+        :type truncate: list
+        '''
+        steps = []
+        try:
+            for (path, text) in changes.items():
+                steps.append(['replace', write_temp(path, text), path])
+        except BaseException:
+            for step in steps:
+                os.remove(step[1])
+            raise
+        steps += [['truncate', path] for path in truncate]
+
+        commit_path = f"{self.directory}/.{names[0].replace(' ', '_')}.commit"
+        write_atomic(commit_path, json.dumps({'lists': list(names), 'steps': steps}))
+        self.apply(steps)
+        os.remove(commit_path)
+
+    def apply(self, steps):
+        '''Perform the steps of a commit, skipping any that have already been performed.'''
+        for step in steps:
+            if step[0] == 'replace' and os.path.exists(step[1]):
+                os.replace(step[1], step[2])
+            elif step[0] == 'truncate' and os.path.exists(step[1]):
+                with open(step[1], 'w'):
+                    pass
+
+    def recover(self):
+        '''Complete commits left unfinished by a process that crashed, once per store.'''
+        if self.recovered or not os.path.isdir(self.directory):
+            return
+        self.recovered = True
+        for file in os.listdir(self.directory):
+            if file.startswith('.') and file.endswith('.commit'):
+                commit_path = f'{self.directory}/{file}'
+                try:
+                    with open(commit_path) as commit_file:
+                        commit = json.load(commit_file)
+                except (OSError, ValueError):
+                    continue
+                with self.locked(*commit['lists']):
+                    if os.path.exists(commit_path):
+                        self.apply(commit['steps'])
+                        os.remove(commit_path)
+
+    def load(self, name):
+        '''Load reading list & format JSON strings as a BookList.'''
+        self.recover()
+        with open(self.path(name)) as file:
+            profiler.count_file('bytes read', file)
             file_data = json.load(file)
             list = file_data['books']
 
-            books = []
+            books = BookList()
             for record in list:
-                book = json.loads(record)
-                books.append(Book(book['id'], book['title'], book['author'], book['publisher']))
+                books.add_dict(json.loads(record))
             return books
 
-    def load_as_list(self):
-        '''Loads reading list from file and then displays associated List.'''
-        list = self.load()
-        List(self.name, list).display()
+    def iter_books(self, name):
+        '''Yield books in reading list one at a time, reading file incrementally.'''
+        self.recover()
+        with open(self.path(name)) as file:
+            profiler.count_file('bytes read', file)
+            for record in iter_json_array(file):
+                yield Book.from_dict(json.loads(record))
+
+    def save(self, name, book):
+        '''Append book to reading list file unless list already contains a book with the same ID.
+
+        :return: True if save was successful; False if not.
+        :rtype: boolean
+        '''
+        path = self.path(name)
+        with self.locked(name):
+            ids = self.cached_ids(path)
+            if ids is not None and book.id in ids:
+                return False
+
+            with open(path) as file:
+                profiler.count_file('bytes read', file)
+                file_data = json.load(file)
+            if ids is None:
+                ids = {json.loads(record)['id'] for record in file_data['books']}
+                if book.id in ids:
+                    self.remember(path, ids)
+                    return False
+            file_data['books'].append(json.dumps(book.to_dict(), indent=4))
+            write_atomic(path, json.dumps(file_data, indent=4))
+            ids.add(book.id)
+            self.remember(path, ids)
+            return True
+
+    def save_many(self, name, books):
+        '''Append books to reading list file in a single write, skipping books already in the list.
+
+        :return: Books that were saved.
+        :rtype: list
+        '''
+        with self.locked(name):
+            current = self.load(name)
+            ids = set(current.ids)
+            saved = []
+            for book in books:
+                if book.id not in ids:
+                    ids.add(book.id)
+                    saved.append(book)
+                    current.append(book)
+            if saved:
+                self.write(name, current)
+            return saved
+
+    def delete(self, name, id):
+        '''Delete book with given ID from reading list file.'''
+        self.delete_many(name, [id])
+
+    def delete_many(self, name, ids):
+        '''Delete books with given IDs from reading list file in a single write.
+
+        :return: IDs of books that were deleted.
+        :rtype: set
+        '''
+        with self.locked(name):
+            books = self.load(name)
+            deleted = set(ids) & set(books.ids)
+            if deleted:
+                self.write(name, books.without(deleted))
+            return deleted
+
+    def write(self, name, books):
+        '''Replace contents of reading list file with given books.'''
+        write_atomic(self.path(name), self.dumps(books))
+        self.remember(self.path(name), set(books.ids))
+
+    def dumps(self, books):
+        '''Format books as contents of a reading list file.'''
+        file_data = {}
+        file_data['books'] = [json.dumps(book.to_dict(), indent=4) for book in books]
+        return json.dumps(file_data, indent=4)
+
+    def move(self, name, target, book):
+        '''Move book from named list to target list.
+
+        :return: True if move was successful; False if target list already contains book.
+        :rtype: boolean
+        '''
+        return bool(self.move_many(name, target, [book]))
+
+    def move_many(self, name, target, books):
+        '''Move books from named list to target list, reading & rewriting each list once.
+
+        Books already in target list or no longer in named list are skipped. Both files are replaced in a 
+        single commit, so a crash never leaves a book in both lists or in neither.
+
+        :return: Books that were moved, in the order they appeared in named list.
+        :rtype: list
+        '''
+        with self.locked(name, target):
+            source_books = self.load(name)
+            target_books = self.load(target)
+            target_ids = set(target_books.ids)
+            moving = {book.id for book in books if book.id not in target_ids}
+            moved = [book for book in source_books if book.id in moving]
+            if not moved or name == target:
+                return []
+
+            remaining = source_books.without(moving)
+            for book in moved:
+                target_books.append(book)
+            self.commit(
+                [name, target],
+                {self.path(name): self.dumps(remaining), self.path(target): self.dumps(target_books)},
+                self.journals(name, target))
+            self.remember(self.path(name), set(remaining.ids))
+            self.remember(self.path(target), set(target_books.ids))
+            return moved
+
+    def journals(self, *names):
+        '''Return paths of journal files to empty when lists are rewritten.'''
+        return []
+
+    def contains(self, name, id):
+        '''Check reading list for book with given ID.'''
+        return id in self.index(name)
+
+    def create(self, name):
+        '''Create an empty reading list file.'''
+        with self.locked(name):
+            self.write(name, BookList())
+            self.catalog_changed()
+
+    def drop(self, name):
+        '''Delete reading list file.'''
+        with self.locked(name):
+            os.remove(self.path(name))
+            self.ids.pop(self.path(name), None)
+            self.catalog_changed()
+
+    def catalog_changed(self):
+        '''Replace catalog file, so other processes see that a list has been created or deleted.'''
+        write_atomic(self.catalog_path(), str(time.time_ns()))
+
+    def version(self):
+        '''Return value that changes whenever a list is created or deleted, by this or another process.
+
+        The lists directory's modification time can't be used, since every atomic rewrite of a list, lock 
+        & index file changes it. Lists added to the directory by hand are found once the app restarts.
+        '''
+        return self.signature(self.catalog_path())
+
+    def list_version(self, name):
+        '''Return value that changes whenever named list changes.'''
+        return self.signature(self.path(name))
+
+    def count(self, name):
+        '''Return number of books in named list.'''
+        return len(self.index(name))
+
+    def modified(self, name):
+        '''Return time named list was last changed, in seconds since the epoch.'''
+        times = [os.stat(path).st_mtime for path in [self.path(name)] + self.journals(name) if os.path.exists(path)]
+        return max(times)
+
+    def names(self):
+        '''Return names of all reading list files.'''
+        list_names = os.listdir(self.directory)
+        clean_list = []
+
+        for list in list_names:
+            if list.endswith('.json') and not list.startswith('.'):
+                name = list.split('.')[0].replace("_", " ")
+                clean_list.append(name)
+        return clean_list
+
+class JournalStore(JsonStore):
+    '''This class stores each reading list as a JSON snapshot plus an append-only JSONL journal.
+
+    Saving, deleting & moving a book appends one line to the list's journal instead of rewriting the whole 
+    file. Loading a list replays the journal over the snapshot. Once a journal holds more than limit 
+    records, it is compacted into a new snapshot. Replaying is idempotent, so a crash during compaction 
+    or a partially written final line never loses or duplicates books.
+    '''
+    def __init__(self, directory=LISTS_DIR, limit=JOURNAL_LIMIT):
+        super().__init__(directory)
+        self.limit = limit
+        self.lengths = {}
+
+    def journal_path(self, name):
+        '''Return path of journal file for named list.'''
+        return f"{self.path(name)}l"
+
+    def signature(self, path):
+        '''Return file details that change whenever snapshot or journal is written.'''
+        return (super().signature(path), super().signature(f'{path}l'))
+
+    def replay(self, name):
+        '''Read list's journal.
+
+        Books in the snapshot whose IDs are in removed are no longer in the list. Books in added that are 
+        not still in the snapshot have been added to the end of the list, in order.
+
+        :return: IDs of removed books & details of added books keyed by ID.
+        :rtype: list
+        '''
+        removed = set()
+        added = {}
+        length = 0
+        try:
+            with open(self.journal_path(name)) as file:
+                profiler.count_file('bytes read', file)
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    length += 1
+                    if record['op'] == 'save':
+                        added.setdefault(record['book']['id'], record['book'])
+                    elif record['op'] == 'delete':
+                        added.pop(record['id'], None)
+                        removed.add(record['id'])
+        except FileNotFoundError:
+            pass
+        self.lengths[self.path(name)] = length
+        return [removed, added]
+
+    def load(self, name):
+        '''Load reading list snapshot & apply journaled changes in order.'''
+        books = super().load(name)
+        [removed, added] = self.replay(name)
+
+        if removed:
+            books = books.without(removed)
+        if added:
+            for id in books.ids:
+                added.pop(id, None)
+        for book in added.values():
+            books.add_dict(book)
+        return books
+
+    def iter_books(self, name):
+        '''Yield books in reading list one at a time, streaming snapshot & then journaled additions.'''
+        [removed, added] = self.replay(name)
+        for book in super().iter_books(name):
+            if book.id not in removed:
+                added.pop(book.id, None)
+                yield book
+        for book in added.values():
+            yield Book.from_dict(book)
+
+    def append(self, name, *records):
+        '''Durably append records to list's journal & compact journal if it has grown too long.
+
+        A partially written record left by a crash is terminated first so it can't corrupt the new records.
+        '''
+        line = ''.join(json.dumps(record) + '\n' for record in records).encode()
+        profiler.count('bytes written', len(line))
+        with open(self.journal_path(name), 'ab+') as file:
+            if file.seek(0, os.SEEK_END):
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    line = b'\n' + line
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+        path = self.path(name)
+        self.lengths[path] = self.lengths.get(path, 0) + len(records)
+        if self.lengths[path] > self.limit:
+            self.compact(name)
+
+    def save(self, name, book):
+        '''Journal book unless list already contains a book with the same ID.
+
+        :return: True if save was successful; False if not.
+        :rtype: boolean
+        '''
+        with self.locked(name):
+            ids = self.index(name)
+            if book.id in ids:
+                return False
+            self.append(name, {'op': 'save', 'book': book.to_dict()})
+            ids.add(book.id)
+            self.remember(self.path(name), ids)
+            return True
+
+    def save_many(self, name, books):
+        '''Journal books in a single append, skipping books already in the list.
+
+        :return: Books that were saved.
+        :rtype: list
+        '''
+        with self.locked(name):
+            ids = self.index(name)
+            saved = []
+            for book in books:
+                if book.id not in ids:
+                    ids.add(book.id)
+                    saved.append(book)
+            if saved:
+                self.append(name, *[{'op': 'save', 'book': book.to_dict()} for book in saved])
+            self.remember(self.path(name), ids)
+            return saved
+
+    def delete(self, name, id):
+        '''Journal deletion of book with given ID, unless list does not contain it.'''
+        with self.locked(name):
+            ids = self.index(name)
+            if id not in ids:
+                return
+            self.append(name, {'op': 'delete', 'id': id})
+            ids.discard(id)
+            self.remember(self.path(name), ids)
+
+    def delete_many(self, name, ids):
+        '''Journal deletion of books with given IDs in a single append.
+
+        :return: IDs of books that were deleted.
+        :rtype: set
+        '''
+        with self.locked(name):
+            current = self.index(name)
+            deleted = set(ids) & current
+            if deleted:
+                self.append(name, *[{'op': 'delete', 'id': id} for id in ids if id in deleted])
+            current -= deleted
+            self.remember(self.path(name), current)
+            return deleted
+
+    def journals(self, *names):
+        '''Return paths of journal files to empty when lists are rewritten.'''
+        return [self.journal_path(name) for name in names]
+
+    def move_many(self, name, target, books):
+        '''Move books from named list to target list by writing new snapshots of both lists.
+
+        :return: Books that were moved, in the order they appeared in named list.
+        :rtype: list
+        '''
+        with self.locked(name, target):
+            moved = super().move_many(name, target, books)
+            if moved:
+                self.lengths[self.path(name)] = 0
+                self.lengths[self.path(target)] = 0
+            return moved
+
+    def compact(self, name):
+        '''Write current contents of list to a new snapshot & empty its journal.'''
+        with self.locked(name):
+            books = self.load(name)
+            self.write(name, books)
+            with open(self.journal_path(name), 'w'):
+                pass
+            self.lengths[self.path(name)] = 0
+            self.remember(self.path(name), set(books.ids))
+
+    def create(self, name):
+        '''Create an empty reading list snapshot & discard any stale journal.'''
+        with self.locked(name):
+            if os.path.exists(self.journal_path(name)):
+                os.remove(self.journal_path(name))
+            super().create(name)
+
+    def drop(self, name):
+        '''Delete reading list snapshot & journal.'''
+        with self.locked(name):
+            if os.path.exists(self.journal_path(name)):
+                os.remove(self.journal_path(name))
+            super().drop(name)
+
+class SqliteStore:
+    '''This class stores all reading lists in a single SQLite database.
+
+    Books are indexed by (list, book ID), so saving, deleting & moving a book only touches a single row 
+    regardless of list size. When the database is first created, existing JSON lists are migrated into it. 
+    Triggers count every change to lists & books in the meta table, so the database's version is kept in 
+    the file & changes however the database is written.
+    '''
+    shared_version = True
+    schema = '''
+        CREATE TABLE IF NOT EXISTS lists (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE COLLATE NOCASE
+        );
+        CREATE TABLE IF NOT EXISTS books (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            list_id INTEGER NOT NULL REFERENCES lists(id) ON DELETE CASCADE,
+            id TEXT NOT NULL,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            publisher TEXT NOT NULL,
+            thumbnail TEXT NOT NULL DEFAULT ''
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS books_list_id ON books(list_id, id);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+    '''
+    triggers = '''
+        CREATE TRIGGER IF NOT EXISTS {table}_{event} AFTER {event} ON {table}
+        BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'version';
+        END;
+    '''
+
+    def __init__(self, filename=DATABASE, directory=LISTS_DIR):
+        self.filename = filename
+        self.directory = directory
+        self.connection = None
+
+    def connect(self):
+        '''Open database the first time it is needed, creating & migrating it if it does not exist.'''
+        if self.connection is None:
+            import sqlite3
+            new = not os.path.exists(self.filename)
+            self.connection = sqlite3.connect(self.filename)
+            self.connection.execute('PRAGMA foreign_keys = ON')
+            self.connection.execute('PRAGMA journal_mode = WAL')
+            self.connection.executescript(self.schema + ''.join(
+                self.triggers.format(table=table, event=event)
+                for table in ['lists', 'books'] for event in ['INSERT', 'UPDATE', 'DELETE']))
+            self.upgrade()
+            if new and os.path.isdir(self.directory):
+                self.migrate(self.directory)
+        return self.connection
+
+    def upgrade(self):
+        '''Add columns missing from a database created by an earlier version.'''
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(books)')]
+        if 'thumbnail' not in columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE books ADD COLUMN thumbnail TEXT NOT NULL DEFAULT ''")
+
+    def list_id(self, name):
+        '''Return row ID of named list, or None if list does not exist.'''
+        row = self.connect().execute('SELECT id FROM lists WHERE name = ?', (name.replace('_', ' '),)).fetchone()
+        return row[0] if row else None
+
+    def load(self, name):
+        '''Load books in named list in the order they were saved.'''
+        rows = self.connect().execute(
+            '''SELECT books.id, title, author, publisher, thumbnail FROM books JOIN lists ON lists.id = list_id
+               WHERE lists.name = ? ORDER BY seq''', (name.replace('_', ' '),))
+        books = BookList()
+        for row in rows:
+            books.add(*row)
+        return books
+
+    def iter_books(self, name):
+        '''Yield books in named list one at a time as rows are read from the database.'''
+        rows = self.connect().execute(
+            '''SELECT books.id, title, author, publisher, thumbnail FROM books JOIN lists ON lists.id = list_id
+               WHERE lists.name = ? ORDER BY seq''', (name.replace('_', ' '),))
+        for row in rows:
+            yield Book(*row)
+
+    def save(self, name, book):
+        '''Insert book into named list unless list already contains a book with the same ID.
+
+        :return: True if save was successful; False if not.
+        :rtype: boolean
+        '''
+        with self.connect() as connection:
+            cursor = connection.execute(
+                '''INSERT OR IGNORE INTO books (list_id, id, title, author, publisher, thumbnail)
+                   SELECT id, ?, ?, ?, ?, ? FROM lists WHERE name = ?''',
+                (book.id, book.title, book.author, book.publisher, book.thumbnail, name.replace('_', ' ')))
+        return cursor.rowcount == 1
+
+    def save_many(self, name, books):
+        '''Insert books into named list in a single transaction, skipping books already in the list.
+
+        :return: Books that were saved.
+        :rtype: list
+        '''
+        list_id = self.list_id(name)
+        saved = []
+        if list_id is None:
+            return saved
+        with self.connect() as connection:
+            for book in books:
+                cursor = connection.execute(
+                    '''INSERT OR IGNORE INTO books (list_id, id, title, author, publisher, thumbnail)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    (list_id, book.id, book.title, book.author, book.publisher, book.thumbnail))
+                if cursor.rowcount == 1:
+                    saved.append(book)
+        return saved
+
+    def delete(self, name, id):
+        '''Delete book with given ID from named list.'''
+        with self.connect() as connection:
+            connection.execute('DELETE FROM books WHERE list_id = ? AND id = ?', (self.list_id(name), id))
+
+    def delete_many(self, name, ids):
+        '''Delete books with given IDs from named list in a single transaction.
+
+        :return: IDs of books that were deleted.
+        :rtype: set
+        '''
+        list_id = self.list_id(name)
+        deleted = set()
+        with self.connect() as connection:
+            for id in ids:
+                cursor = connection.execute('DELETE FROM books WHERE list_id = ? AND id = ?', (list_id, id))
+                if cursor.rowcount == 1:
+                    deleted.add(id)
+        return deleted
+
+    def move(self, name, target, book):
+        '''Move book to target list by updating its row.
+
+        :return: True if move was successful; False if target list already contains book.
+        :rtype: boolean
+        '''
+        return bool(self.move_many(name, target, [book]))
+
+    def move_many(self, name, target, books):
+        '''Move books to target list in a single transaction, skipping books already in target list.
+
+        :return: Books that were moved, as stored in named list & in the order they were saved to it.
+        :rtype: list
+        '''
+        source_id = self.list_id(name)
+        target_id = self.list_id(target)
+        if source_id is None or target_id is None or source_id == target_id:
+            return []
+        moved = []
+        with self.connect() as connection:
+            for id in dict.fromkeys(book.id for book in books):
+                row = connection.execute(
+                    'SELECT seq, id, title, author, publisher, thumbnail FROM books WHERE list_id = ? AND id = ?',
+                    (source_id, id)).fetchone()
+                if row is None:
+                    continue
+                cursor = connection.execute('UPDATE OR IGNORE books SET list_id = ? WHERE seq = ?', (target_id, row[0]))
+                if cursor.rowcount == 1:
+                    moved.append(row)
+        return [Book(*row[1:]) for row in sorted(moved)]
+
+    def contains(self, name, id):
+        '''Check named list for book with given ID.'''
+        row = self.connect().execute(
+            'SELECT 1 FROM books WHERE list_id = ? AND id = ?', (self.list_id(name), id)).fetchone()
+        return row is not None
+
+    def create(self, name):
+        '''Create an empty reading list.'''
+        with self.connect() as connection:
+            connection.execute('INSERT OR IGNORE INTO lists (name) VALUES (?)', (name.replace('_', ' '),))
+
+    def drop(self, name):
+        '''Delete named list & all of its books.'''
+        with self.connect() as connection:
+            connection.execute('DELETE FROM lists WHERE name = ?', (name.replace('_', ' '),))
+
+    def version(self):
+        '''Return number of changes made to the database by this or any other connection, in any session.'''
+        return self.connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def list_version(self, name):
+        '''Return value that changes whenever named list may have changed.'''
+        return self.version()
+
+    def count(self, name):
+        '''Return number of books in named list.'''
+        return self.connect().execute('SELECT COUNT(*) FROM books WHERE list_id = ?', (self.list_id(name),)).fetchone()[0]
+
+    def modified(self, name):
+        '''Return time database was last changed, in seconds since the epoch.'''
+        return os.stat(self.filename).st_mtime
+
+    def names(self):
+        '''Return names of all reading lists.'''
+        return [row[0] for row in self.connect().execute('SELECT name FROM lists ORDER BY id')]
+
+    def migrate(self, directory=LISTS_DIR):
+        '''Copy all JSON reading lists in directory into the database.
+
+        Lists & books that already exist in the database are skipped, so migrating twice is harmless.
+
+        :return: Number of books copied.
+        :rtype: int
+        '''
+        source = JsonStore(directory)
+        copied = 0
+        with self.connect() as connection:
+            for name in source.names():
+                connection.execute('INSERT OR IGNORE INTO lists (name) VALUES (?)', (name,))
+                list_id = connection.execute('SELECT id FROM lists WHERE name = ?', (name,)).fetchone()[0]
+                cursor = connection.executemany(
+                    '''INSERT OR IGNORE INTO books (list_id, id, title, author, publisher, thumbnail)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                    [(list_id, book.id, book.title, book.author, book.publisher, book.thumbnail)
+                     for book in source.load(name)])
+                copied += cursor.rowcount
+        return copied
+
+    def close(self):
+        '''Close database connection.'''
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+class BookIndex:
+    '''This class indexes the title, author & publisher of every saved book for offline search.
+
+    Each word maps to the books containing it, and words are also kept in sorted order so every word 
+    starting with a search term can be found with a binary search. Searches start from the search term 
+    matching the fewest books & check the remaining terms against those books only. The index is built from all lists the 
+    first time it is searched and then kept up to date as books are saved, deleted & moved.
+    '''
+    weights = {'title': 3, 'author': 2, 'publisher': 1}
+
+    def __init__(self):
+        self.built = False
+        self.books = {}
+        self.postings = {}
+        self.words = []
+
+    def tokenize(self, text):
+        '''Split text into lowercase words.'''
+        return re.findall('[a-z0-9]+', text.lower())
+
+    def build(self):
+        '''Index every book in every reading list.'''
+        self.built = True
+        self.books = {}
+        self.postings = {}
+        self.words = []
+        for name in File.store.names():
+            list_name = File(name).name
+            for book in File.store.iter_books(name):
+                self.add(list_name, book)
+
+    def add(self, list_name, book):
+        '''Index book saved to named list.'''
+        key = (list_name, book.id)
+        if key in self.books:
+            self.remove(list_name, book.id)
+        self.books[key] = book
+        for (field, weight) in self.weights.items():
+            for word in self.tokenize(getattr(book, field)):
+                postings = self.postings.get(word)
+                if postings is None:
+                    postings = self.postings[word] = {}
+                    bisect.insort(self.words, word)
+                postings[key] = max(postings.get(key, 0), weight)
+
+    def remove(self, list_name, id):
+        '''Remove book with given ID in named list from index.'''
+        key = (list_name, id)
+        book = self.books.pop(key, None)
+        if book is None:
+            return
+        for field in self.weights:
+            for word in self.tokenize(getattr(book, field)):
+                postings = self.postings.get(word)
+                if postings is not None:
+                    postings.pop(key, None)
+                    if not postings:
+                        del self.postings[word]
+                        del self.words[bisect.bisect_left(self.words, word)]
+
+    def remove_list(self, list_name):
+        '''Remove all books in named list from index.'''
+        for key in [key for key in self.books if key[0] == list_name]:
+            self.remove(*key)
+
+    def search(self, query, limit=20):
+        '''Find saved books matching every word of query, allowing words to match the start of longer words.
+
+        Results are ranked by where words matched (title, then author, then publisher), with whole-word 
+        matches ranked above partial matches.
+
+        :param query: Search terms.
+        :type query: str
+        :param limit: Maximum number of results.
+        :type limit: int
+        :return: List of [list name, Book] pairs, best match first.
+        :rtype: list
+        '''
+        if not self.built:
+            self.build()
+        terms = set(self.tokenize(query))
+        if not terms:
+            return []
+        words = {term: self.matching_words(term) for term in terms}
+        rarest = min(terms, key=lambda term: sum(len(self.postings[word]) for word in words[term]))
+
+        scores = {}
+        for word in words[rarest]:
+            bonus = 2 if word == rarest else 1
+            for (key, weight) in self.postings[word].items():
+                scores[key] = max(scores.get(key, 0), weight * bonus)
+        for term in terms - {rarest}:
+            for key in list(scores):
+                score = self.score(self.books[key], term)
+                if score:
+                    scores[key] += score
+                else:
+                    del scores[key]
+
+        ranked = heapq.nsmallest(limit, scores, key=lambda key: (-scores[key], key))
+        return [[key[0], self.books[key]] for key in ranked]
+
+    def matching_words(self, term):
+        '''Return indexed words starting with term.'''
+        i = bisect.bisect_left(self.words, term)
+        words = []
+        while i < len(self.words) and self.words[i].startswith(term):
+            words.append(self.words[i])
+            i += 1
+        return words
+
+    def score(self, book, term):
+        '''Score how well a single search term matches book.'''
+        score = 0
+        for (field, weight) in self.weights.items():
+            for word in self.tokenize(getattr(book, field)):
+                if word.startswith(term):
+                    score = max(score, weight * (2 if word == term else 1))
+        return score
+
+class ListCatalog:
+    '''This class caches the names of all reading lists along with each list's book count & last change.
+
+    Names are read from the store again only when the store reports that lists have changed, and a list's 
+    details only when that list has changed, so moving between menus doesn't rescan the lists directory.
+    '''
+    def __init__(self):
+        self.version = None
+        self.list_names = None
+        self.details = {}
+
+    def names(self):
+        '''Return names of all reading lists.'''
+        version = File.store.version()
+        if self.list_names is None or version != self.version:
+            self.list_names = File.store.names()
+            self.version = version
+        return list(self.list_names)
+
+    def invalidate(self):
+        '''Forget list names after a list is created or deleted.'''
+        self.list_names = None
+
+    def count(self, name):
+        '''Return number of books in named list.'''
+        return self.lookup(name)['count']
+
+    def modified(self, name):
+        '''Return time named list was last changed, in seconds since the epoch.'''
+        return self.lookup(name)['modified']
+
+    def lookup(self, name):
+        '''Return cached details of named list, recalculating them if list has changed.'''
+        version = File.store.list_version(name)
+        cached = self.details.get(name)
+        if cached is None or cached[0] != version:
+            cached = (version, {'count': File.store.count(name), 'modified': File.store.modified(name)})
+            self.details[name] = cached
+        return cached[1]
+
+    def label(self, name):
+        '''Return list name with number of books in list, for display in menus.'''
+        count = self.count(name)
+        return f"{name} ({count} {'book' if count == 1 else 'books'})"
+
+class SavedIndex:
+    '''This class records which reading lists each saved book is in, so search results can show which books 
+    are already saved without reading any list.
+
+    The index is kept in a hidden file in the lists directory along with the version of each list it was 
+    read from, and a list is only read again when its version changes. Books saved, deleted & moved 
+    through File update the index directly, so lists are only read again after a change made some other 
+    way, such as by another process or in a session that ended before the index was saved.
+    '''
+    def __init__(self):
+        self.directory = None
+        self.lists = None
+        self.members = {}
+        self.dirty = False
+
+    def key(self, name):
+        '''Return key for list name, ignoring case & underscores.'''
+        return name.replace('_', ' ').lower()
+
+    def version(self, name):
+        '''Return current version of named list in a form that can be compared with one read from JSON.'''
+        return json.loads(json.dumps(File.store.list_version(name)))
+
+    def path(self):
+        '''Return path of index file.'''
+        return os.path.join(self.directory, '.saved.json')
+
+    def load(self):
+        '''Read index file the first time index is used, or when the store has changed.'''
+        if self.lists is not None and self.directory == File.store.directory:
+            return
+        self.directory = File.store.directory
+        try:
+            with open(self.path()) as file:
+                self.lists = json.load(file)['lists']
+        except (OSError, ValueError, KeyError):
+            self.lists = {}
+        self.members = {}
+        self.dirty = False
+        for (key, entry) in self.lists.items():
+            entry['ids'] = set(entry['ids'])
+            for id in entry['ids']:
+                self.members.setdefault(id, set()).add(key)
+
+    def refresh(self):
+        '''Read lists that have changed since they were indexed & forget lists that no longer exist.'''
+        self.load()
+        names = {self.key(name): name for name in File.catalog.names()}
+        for key in [key for key in self.lists if key not in names]:
+            self.forget(key)
+        for (key, name) in names.items():
+            entry = self.lists.get(key)
+            version = self.version(name)
+            if entry is None or entry['version'] != version:
+                self.forget(key)
+                ids = {book.id for book in File.store.iter_books(name)}
+                self.lists[key] = {'name': name, 'version': version, 'ids': ids}
+                for id in ids:
+                    self.members.setdefault(id, set()).add(key)
+                self.dirty = True
+
+    def forget(self, key):
+        '''Remove list from index.'''
+        entry = self.lists.pop(key, None)
+        if entry is None:
+            return
+        for id in entry['ids']:
+            lists = self.members.get(id)
+            if lists:
+                lists.discard(key)
+                if not lists:
+                    del self.members[id]
+        self.dirty = True
+
+    def lookup(self, ids):
+        '''Return names of lists each book is saved to.
+
+        :param ids: IDs of books to look up.
+        :type ids: list
+        :return: Sorted list names keyed by book ID, for books that are saved to at least one list.
+        :rtype: dict
+        '''
+        self.refresh()
+        return {
+            id: sorted(self.lists[key]['name'] for key in self.members[id])
+            for id in ids if self.members.get(id)
+        }
+
+    def lists_containing(self, id):
+        '''Return names of lists book with given ID is saved to.'''
+        return self.lookup([id]).get(id, [])
+
+    def before_change(self, *names):
+        '''Return versions of named lists before they are changed, or None if index is not in use.'''
+        if self.lists is None:
+            return None
+        return {name: self.version(name) for name in names}
+
+    def changed(self, before, added=None, removed=None):
+        '''Record books added to & removed from lists.
+
+        Changes to a list are applied to the index only if it was up to date with the list before the 
+        change, otherwise the list is read again the next time the index is used. When the store has one 
+        version for all lists, other lists that were up to date are kept up to date.
+
+        :param before: Versions of changed lists before change, from before_change.
+        :type before: dict
+        :param added: IDs of books added, keyed by list name.
+        :type added: dict
+        :param removed: IDs of books removed, keyed by list name.
+        :type removed: dict
+        '''
+        if self.lists is None or before is None:
+            return
+        (added, removed) = (added or {}, removed or {})
+        current = {}
+        for (name, version) in before.items():
+            key = self.key(name)
+            entry = self.lists.get(key)
+            if entry is None or entry['version'] != version:
+                self.forget(key)
+                continue
+            for id in removed.get(name, ()):
+                if id in entry['ids']:
+                    entry['ids'].discard(id)
+                    self.members[id].discard(key)
+                    if not self.members[id]:
+                        del self.members[id]
+            for id in added.get(name, ()):
+                entry['ids'].add(id)
+                self.members.setdefault(id, set()).add(key)
+            entry['version'] = current[name] = self.version(name)
+            self.dirty = True
+        if File.store.shared_version and current:
+            version = next(iter(current.values()))
+            for entry in self.lists.values():
+                if entry['version'] in before.values():
+                    entry['version'] = version
+
+    def dropped(self, name):
+        '''Remove deleted list from index.'''
+        if self.lists is not None:
+            self.forget(self.key(name))
+
+    def write(self):
+        '''Save index file if index has changed.'''
+        if self.lists is None or not self.dirty or not os.path.isdir(self.directory):
+            return
+        lists = {key: {**entry, 'ids': sorted(entry['ids'])} for (key, entry) in self.lists.items()}
+        write_atomic(self.path(), json.dumps({'lists': lists}))
+        self.dirty = False
+
+class ListView:
+    '''This class describes how a page of a reading list is shown: its sort order & an optional filter.
+
+    Books are sorted by title, author or publisher, or by when they were added. A filter shows only books 
+    with a field (or any field, if field is None) that contains text, or starts with it if prefix is True.
+    '''
+    sorts = {
+        'Title': 'title',
+        'Author': 'author',
+        'Publisher': 'publisher',
+        'Date added (newest first)': 'newest',
+        'Date added (oldest first)': 'added',
+    }
+    filters = {
+        f'{label} {match}': (field, match == 'starts with')
+        for (label, field) in [('Any field', None), ('Title', 'title'), ('Author', 'author'), ('Publisher', 'publisher')]
+        for match in ['contains', 'starts with']
+    }
+
+    def __init__(self, sort='added', field=None, text='', prefix=False):
+        self.sort = sort
+        self.field = field
+        self.text = text
+        self.prefix = prefix
+
+    def is_default(self):
+        '''Return True if view shows whole list in the order books were added.'''
+        return self.sort == 'added' and not self.text
+
+    def matching(self):
+        '''Return description of filter.'''
+        match = 'starts with' if self.prefix else 'contains'
+        return f'where {self.field or "any field"} {match} "{self.text}"'
+
+    def describe(self):
+        '''Return description of sort order & filter for page heading.'''
+        parts = []
+        if self.sort == 'newest':
+            parts.append('newest first')
+        elif self.sort != 'added':
+            parts.append(f'sorted by {self.sort}')
+        if self.text:
+            parts.append(self.matching())
+        return ', '.join(parts)
+
+class ListKeys:
+    '''This class holds the details of every book in one reading list, in the order they were added, along 
+    with the order of the list sorted by each of title, author & publisher.
+
+    Sort keys are normalized so case, accents & leading articles in titles are ignored. Books with equal 
+    keys stay in the order they were added. Adding or removing a book finds its place in each sorted order 
+    by binary search, computing keys for only a few books, so a sorted page can be read without sorting 
+    the list again.
+    '''
+    fields = ('title', 'author', 'publisher')
+    articles = re.compile(r'^(the|an|a)\s+')
+
+    def __init__(self, name, version=None):
+        self.name = name
+        self.version = version
+        self.books = {}
+        self.order = {field: [] for field in self.fields}
+        self.dirty = False
+
+    @staticmethod
+    def fold(value):
+        '''Return value in lower case without accents, for sorting & matching.'''
+        if not value.isascii():
+            import unicodedata
+            value = ''.join(char for char in unicodedata.normalize('NFKD', value) if not unicodedata.combining(char))
+        return value.casefold()
+
+    def sort_key(self, field, value):
+        '''Return normalized sort key for field value. Leading articles are ignored in titles & empty 
+        values sort last.'''
+        key = ' '.join(self.fold(value).split())
+        if field == 'title':
+            key = self.articles.sub('', key)
+        return key or '\uffff'
+
+    def key_function(self, field):
+        '''Return function giving sort key of field for a book ID.'''
+        i = self.fields.index(field)
+        return lambda id: self.sort_key(field, self.books[id][i])
+
+    def add(self, book):
+        '''Add book to end of list, unless it is already in list.'''
+        if book.id in self.books:
+            return
+        self.books[book.id] = (book.title, book.author, book.publisher, book.thumbnail)
+        for field in self.fields:
+            bisect.insort_right(self.order[field], book.id, key=self.key_function(field))
+
+    def extend(self, books):
+        '''Add several books to end of list, sorting each order once rather than inserting each book.'''
+        for book in books:
+            if book.id not in self.books:
+                self.books[book.id] = (book.title, book.author, book.publisher, book.thumbnail)
+        for field in self.fields:
+            self.order[field] = sorted(self.books, key=self.key_function(field))
+
+    def remove(self, id):
+        '''Remove book with given ID, if it is in list.'''
+        if id not in self.books:
+            return
+        for field in self.fields:
+            key = self.key_function(field)
+            order = self.order[field]
+            position = bisect.bisect_left(order, key(id), key=key)
+            while position < len(order) and order[position] != id:
+                position += 1
+            if position < len(order):
+                del order[position]
+        del self.books[id]
+
+    def ordered(self, sort):
+        '''Return IDs of books in given sort order.'''
+        if sort == 'added':
+            return iter(self.books)
+        if sort == 'newest':
+            return reversed(self.books)
+        return iter(self.order[sort])
+
+    def matches(self, id, view, text):
+        '''Return True if book with given ID passes view's filter, given its text folded with fold.'''
+        row = self.books[id]
+        values = [row[self.fields.index(view.field)]] if view.field else row[:len(self.fields)]
+        for value in values:
+            value = self.fold(value)
+            if value.startswith(text) if view.prefix else text in value:
+                return True
+        return False
+
+    def page(self, view, start_index=0, count=PAGE_SIZE):
+        '''Return one page of list as shown in view, reading no further into sorted order than needed.
+
+        :return: BookList of books on page & True if more books follow page, else False.
+        :rtype: list
+        '''
+        if view.text:
+            text = self.fold(view.text)
+            ids = (id for id in self.ordered(view.sort) if self.matches(id, view, text))
+            ids = list(itertools.islice(ids, start_index, start_index + count + 1))
+        elif view.sort in self.order:
+            ids = self.order[view.sort][start_index:start_index + count + 1]
+        else:
+            ids = list(itertools.islice(self.ordered(view.sort), start_index, start_index + count + 1))
+        books = BookList()
+        for id in ids[:count]:
+            books.add(id, *self.books[id])
+        return [books, len(ids) > count]
+
+    def to_dict(self):
+        '''Return list details & sorted orders as a dictionary for saving as JSON. Each sorted order is 
+        saved as positions of books in the list.'''
+        positions = {id: i for (i, id) in enumerate(self.books)}
+        return {
+            'name': self.name,
+            'version': self.version,
+            'books': [[id, *row] for (id, row) in self.books.items()],
+            'order': {field: [positions[id] for id in self.order[field]] for field in self.fields},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        '''Return list keys read from a dictionary saved by to_dict.'''
+        keys = cls(data['name'], data['version'])
+        keys.books = {row[0]: tuple(row[1:]) for row in data['books']}
+        ids = list(keys.books)
+        keys.order = {field: [ids[i] for i in data['order'][field]] for field in cls.fields}
+        return keys
+
+class SortIndex:
+    '''This class keeps sort keys for reading lists that have been shown sorted or filtered.
+
+    Keys for each list are kept in a hidden file next to the list, along with the version of the list 
+    they were read from. Books saved, deleted & moved through File update the keys of lists that have 
+    them, and a list is only read & sorted again if it has changed in some other way, such as by another 
+    process or in a session that ended before its keys were saved.
+    '''
+    def __init__(self):
+        self.directory = None
+        self.lists = {}
+
+    def key(self, name):
+        '''Return key for list name, ignoring case & underscores.'''
+        return name.replace('_', ' ').lower()
+
+    def path(self, name):
+        '''Return path of keys file for named list.'''
+        return os.path.join(self.directory, f".{self.key(name).replace(' ', '_')}.keys.json")
+
+    def version(self, name):
+        '''Return current version of named list in a form that can be compared with one read from JSON.'''
+        return json.loads(json.dumps(File.store.list_version(name)))
+
+    def reset(self):
+        '''Forget keys read from another store.'''
+        if self.directory != File.store.directory:
+            self.directory = File.store.directory
+            self.lists = {}
+
+    def read(self, name):
+        '''Return keys saved for named list, or None if there are none.'''
+        try:
+            with open(self.path(name)) as file:
+                return ListKeys.from_dict(json.load(file))
+        except (OSError, ValueError, KeyError, TypeError, IndexError):
+            return None
+
+    def get(self, name):
+        '''Return up-to-date keys for named list, reading saved keys or the list itself if needed.'''
+        self.reset()
+        key = self.key(name)
+        version = self.version(name)
+        keys = self.lists.get(key)
+        if keys is None or keys.version != version:
+            keys = self.read(name)
+        if keys is None or keys.version != version:
+            keys = ListKeys(name, version)
+            keys.extend(File.store.iter_books(name))
+            keys.dirty = True
+        self.lists[key] = keys
+        return keys
+
+    def page(self, name, view, start_index=0, count=PAGE_SIZE):
+        '''Return one page of named list as shown in view; see ListKeys.page.'''
+        return self.get(name).page(view, start_index, count)
+
+    def before_change(self, *names):
+        '''Return versions of named lists that have keys before they are changed.'''
+        self.reset()
+        versions = {}
+        for name in names:
+            key = self.key(name)
+            if key not in self.lists and os.path.exists(self.path(name)):
+                keys = self.read(name)
+                if keys is not None:
+                    self.lists[key] = keys
+            if key in self.lists:
+                versions[name] = self.version(name)
+        return versions
+
+    def changed(self, before, added=None, removed=None):
+        '''Record books added to & removed from lists; see SavedIndex.changed.
+
+        :param added: Books added, as returned by the store rather than as passed in, keyed by list name.
+        :type added: dict
+        :param removed: IDs of books removed, keyed by list name.
+        :type removed: dict
+        '''
+        (added, removed) = (added or {}, removed or {})
+        current = {}
+        for (name, version) in before.items():
+            key = self.key(name)
+            keys = self.lists.get(key)
+            if keys is None or keys.version != version:
+                self.lists.pop(key, None)
+                continue
+            for id in removed.get(name, ()):
+                keys.remove(id)
+            for book in added.get(name, ()):
+                keys.add(book)
+            keys.version = current[name] = self.version(name)
+            keys.dirty = True
+        if File.store.shared_version and current:
+            version = next(iter(current.values()))
+            for keys in self.lists.values():
+                if keys.version in before.values():
+                    keys.version = version
+
+    def dropped(self, name):
+        '''Forget keys of deleted list.'''
+        self.reset()
+        self.lists.pop(self.key(name), None)
+        if os.path.exists(self.path(name)):
+            os.remove(self.path(name))
+
+    def write(self):
+        '''Save keys of lists that have changed.'''
+        for keys in self.lists.values():
+            if keys.dirty and os.path.isdir(self.directory):
+                write_atomic(self.path(keys.name), json.dumps(keys.to_dict()))
+                keys.dirty = False
+
+class File:  
+    '''This class handles reading list files.
+
+    Reading and writing is delegated to the store named by the BOOKS_STORAGE environment variable: "json" 
+    (default) for JSON files in the lists directory, "journal" for JSON files with append-only journals, 
+    or "sqlite" for a SQLite database.
+    '''
+    store = {'json': JsonStore, 'journal': JournalStore, 'sqlite': SqliteStore}[STORAGE]()
+    search_index = BookIndex()
+    catalog = ListCatalog()
+    saved_index = SavedIndex()
+    sort_index = SortIndex()
+
+    def __init__(self, name):
+        self.name = f"{name.replace('_', ' ').title()}"
+        self.list_name = name
+
+    def load(self):
+        '''Load reading list as a list of Book instances.'''
+        return self.store.load(self.list_name)
+
+    def iter_books(self):
+        '''Yield books in reading list one at a time without loading whole list into memory.'''
+        return self.store.iter_books(self.list_name)
+
+    def load_page(self, start_index=0, count=PAGE_SIZE):
+        '''Load one page of reading list, reading no further into the list than needed.
+
+        :param start_index: Position in list of first book on page.
+        :type start_index: int
+        :param count: Number of books per page.
+        :type count: int
+        :return: BookList of books on page & True if more books follow page, else False.
+        :rtype: list
+        '''
+        books = BookList(itertools.islice(self.iter_books(), start_index, start_index + count + 1))
+        more = len(books) > count
+        return [books[:count], more]
+
+    def load_view(self, view, start_index=0, count=PAGE_SIZE):
+        '''Load one page of reading list sorted & filtered as described by view.
+
+        :param view: Sort order & filter.
+        :type view: ListView obj
+        :return: BookList of books on page & True if more books follow page, else False.
+        :rtype: list
+        '''
+        if view.is_default():
+            return self.load_page(start_index, count)
+        return self.sort_index.page(self.list_name, view, start_index, count)
+
+    def load_as_list(self, start_index=0, view=None):
+        '''Loads a page of reading list from file and then displays associated List.
+
+        :param view: Sort order & filter, or None to show books in the order they were added.
+        :type view: ListView obj
+        :return: Action selected by user from list menu.
+        :rtype: function
+        '''
+        view = view or ListView()
+        count = terminal.page_size
+        [books, more] = self.load_view(view, start_index, count)
+        while not books and start_index > 0:
+            start_index = max(start_index - count, 0)
+            [books, more] = self.load_view(view, start_index, count)
+        return List(self.list_name, books, start_index, more, view).display()
+
+    def before_change(self, *names):
+        '''Return versions of lists before they are changed, for updating indexes of lists afterwards.'''
+        return (self.saved_index.before_change(*names), self.sort_index.before_change(*names))
+
+    def changed(self, before, added=None, removed=None):
+        '''Update indexes of lists after books are added or removed.
+
+        :param before: Versions of lists before change, from before_change.
+        :type before: tuple
+        :param added: Books added, as returned by the store rather than as passed in, keyed by list name.
+        :type added: dict
+        :param removed: IDs of books removed, keyed by list name.
+        :type removed: dict
+        '''
+        added_ids = {name: [book.id for book in books] for (name, books) in (added or {}).items()}
+        self.saved_index.changed(before[0], added_ids, removed)
+        self.sort_index.changed(before[1], added, removed)
 
     def delete_record(self, to_delete):
         '''Delete selected book from reading list.
@@ -53,55 +1658,110 @@ class File:
         :param to_delete: Book record selected for deletion.
         :type to_delete: Book obj
         '''
-        books = self.load()
-        file_data = {}
-        file_data['books'] = []
-
-        for book in books:
-            if book.id != to_delete.id:
-                json_book = json.dumps(book.__dict__, indent=4)
-                file_data['books'].append(json_book)
-
-        with open(self.filename, 'w') as file:
-            json.dump(file_data, file, indent=4)
+        before = self.before_change(self.list_name)
+        self.store.delete(self.list_name, to_delete.id)
+        self.changed(before, removed={self.list_name: [to_delete.id]})
+        if self.search_index.built:
+            self.search_index.remove(self.name, to_delete.id)
 
     def save(self, book):
-        '''Append book data to reading list JSON file.
+        '''Append book data to reading list.
         
         :param book: Selected search result.
-        :type book: 
+        :type book: Book obj
         :return: True if save was successful; False if not.
         :rtype: boolean
         '''
-        json_book = json.dumps(book.__dict__, indent=4)
+        before = self.before_change(self.list_name)
+        saved = self.store.save(self.list_name, book)
+        if saved:
+            self.changed(before, added={self.list_name: [book]})
+        if saved and self.search_index.built:
+            self.search_index.add(self.name, book)
+        return saved
+
+    def save_records(self, books):
+        '''Append several books to reading list in one operation.
+
+        :param books: Books to save.
+        :type books: list
+        :return: Books that were saved; books already in list are skipped.
+        :rtype: list
+        '''
+        before = self.before_change(self.list_name)
+        saved = self.store.save_many(self.list_name, books)
+        self.changed(before, added={self.list_name: saved})
+        if self.search_index.built:
+            for book in saved:
+                self.search_index.add(self.name, book)
+        return saved
+
+    def delete_records(self, ids):
+        '''Delete several books from reading list in one operation.
+
+        :param ids: IDs of books to delete.
+        :type ids: list
+        :return: IDs of books that were deleted; IDs not in list are skipped.
+        :rtype: set
+        '''
+        before = self.before_change(self.list_name)
+        deleted = self.store.delete_many(self.list_name, ids)
+        self.changed(before, removed={self.list_name: deleted})
+        if self.search_index.built:
+            for id in deleted:
+                self.search_index.remove(self.name, id)
+        return deleted
+
+    def move_record(self, book, target):
+        '''Move book from this reading list to target list.
+
+        :param book: Book record selected for move.
+        :type book: Book obj
+        :param target: Name of list to move book to.
+        :type target: str
+        :return: True if move was successful; False if target list already contains book.
+        :rtype: boolean
+        '''
+        return bool(self.move_records([book], target))
 
-        if self.list_contains_dupe(book.id):
-            return False
-        else:
-            with open(self.filename, 'r+') as file:
-                file_data = json.load(file)
-                file_data['books'].append(json_book)
-                file.seek(0)
-                json.dump(file_data, file, indent=4)
-            return True
+    def move_records(self, books, target):
+        '''Move several books from this reading list to target list in one operation.
+
+        :param books: Book records selected for move.
+        :type books: list
+        :param target: Name of list to move books to.
+        :type target: str
+        :return: Books that were moved; books already in target list are skipped.
+        :rtype: list
+        '''
+        before = self.before_change(self.list_name, target)
+        moved = self.store.move_many(self.list_name, target, books)
+        self.changed(before, added={target: moved}, removed={self.list_name: [book.id for book in moved]})
+        if self.search_index.built:
+            for book in moved:
+                self.search_index.remove(self.name, book.id)
+                self.search_index.add(File(target).name, book)
+        return moved
     
     def delete_file(self):
-        '''Delete file from ./lists directory.'''
-        os.remove(self.filename)
+        '''Delete reading list.'''
+        self.store.drop(self.list_name)
+        self.catalog.invalidate()
+        self.saved_index.dropped(self.list_name)
+        self.sort_index.dropped(self.list_name)
+        if self.search_index.built:
+            self.search_index.remove_list(self.name)
 
     def create(self):
         '''Create a new reading list file'''
-        file_data = {}
-        file_data['books'] = []
-
         if self.list_name_taken():
             return 'duplicate'
         if self.list_name_invalid():
             return 'invalid'
 
-        with open(self.filename, 'w') as file:
-            json.dump(file_data, file, indent=4)
-            return 'success'
+        self.store.create(self.list_name)
+        self.catalog.invalidate()
+        return 'success'
     
     def list_contains_dupe(self, id):
         '''Check for book with duplicate ID in reading list.
@@ -111,19 +1771,15 @@ class File:
         :return True if duplicate ID exists; False if not.
         :rtype: boolean
         '''
-        books = self.load()
-        for book in books:
-            if book.id == id:
-                return True
-        return False
+        return self.store.contains(self.list_name, id)
 
     def list_name_taken(self):
         '''Check file directory for file with duplicate name.
         :return: True if duplicate exists; False if not.
         :rtype: boolean
         '''
-        lists = list_all_lists()
-        if self.name in lists:
+        lists = [name.lower() for name in list_all_lists()]
+        if self.name.lower() in lists:
             return True
         return False
         
@@ -135,6 +1791,731 @@ class File:
         return bool(re.search('[^a-zA-Z0-9\s]+$', self.name))
 
 
+class SearchCache:
+    '''This class stores Google Books API responses on disk so repeated searches skip the network.
+
+    Entries are kept in least-recently-used order: a hit moves the entry to the end and, once the cache 
+    holds more than max_entries, the oldest entries are evicted. Entries older than ttl seconds are misses.
+    '''
+    def __init__(self, filename=f'{CACHE_DIR}/search.json', ttl=CACHE_TTL, max_entries=CACHE_SIZE):
+        self.filename = filename
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = None
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def key(self, type, term, start_index, max_results):
+        '''Build cache key for a single page of search results.
+
+        :return: Key identifying query type, search term, start index & page size.
+        :rtype: str
+        '''
+        return json.dumps([type, term, int(start_index), int(max_results)])
+
+    def load(self):
+        '''Read cached entries from disk the first time the cache is used.'''
+        with self.lock:
+            if self.entries is None:
+                try:
+                    with open(self.filename) as file:
+                        self.entries = json.load(file)
+                except (OSError, ValueError):
+                    self.entries = {}
+            return self.entries
+
+    def get(self, key):
+        '''Look up cached response data.
+
+        :param key: Key returned by SearchCache.key.
+        :type key: str
+        :return: Response data if cached & not expired; None if not.
+        :rtype: dict
+        '''
+        with self.lock:
+            entries = self.load()
+            entry = entries.pop(key, None)
+            if entry is None or time.time() - entry['time'] > self.ttl:
+                self.misses += 1
+                return None
+            entries[key] = entry
+            self.hits += 1
+            return entry['data']
+
+    def contains(self, key):
+        '''Check for unexpired entry without updating counters or LRU order.'''
+        with self.lock:
+            entry = self.load().get(key)
+            return entry is not None and time.time() - entry['time'] <= self.ttl
+
+    def put(self, key, data):
+        '''Add response data to cache, evict least recently used entries & write cache to disk.'''
+        with self.lock:
+            entries = self.load()
+            entries.pop(key, None)
+            entries[key] = {'time': time.time(), 'data': data}
+            while len(entries) > self.max_entries:
+                del entries[next(iter(entries))]
+            self.write()
+
+    def write(self):
+        '''Write cached entries to disk.'''
+        os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+        write_atomic(self.filename, json.dumps(self.entries))
+
+    def clear(self):
+        '''Remove all cached entries.'''
+        with self.lock:
+            self.entries = {}
+            self.write()
+
+    def stats(self):
+        '''Return cache size & hit/miss counters.'''
+        return {'entries': len(self.load()), 'hits': self.hits, 'misses': self.misses}
+
+
+@functools.lru_cache(maxsize=None)
+def capped_retry():
+    '''Return class that retries failed requests, capping server-requested Retry-After waits at backoff_max.
+
+    The class is defined when the first search is sent, so urllib3 is not imported by sessions that only 
+    browse saved lists.
+    '''
+    from urllib3.util.retry import Retry
+
+    class CappedRetry(Retry):
+        def get_retry_after(self, response):
+            retry_after = super().get_retry_after(response)
+            if retry_after is None:
+                return None
+            return min(retry_after, self.backoff_max)
+
+    return CappedRetry
+
+class ApiSession:
+    '''This class sends requests to the Google Books API over pooled keep-alive connections.
+
+    Requests time out after timeout seconds (connect, read). Responses with status 429 or 5xx are retried 
+    up to retries times with exponential backoff, honoring the server's Retry-After header. Read timeouts 
+    are not retried so a hung server costs the user one timeout rather than several. Responses are 
+    requested gzip-compressed; Google APIs only compress responses when the user agent contains "gzip".
+
+    requests is imported when the first request is sent rather than at startup, as it takes longer to 
+    import than the rest of the app.
+    '''
+    def __init__(self, timeout=API_TIMEOUT, retries=API_RETRIES, backoff=0.5, max_backoff=10, pool_size=4):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        self.session = None
+        self.adapter = None
+
+    def connect(self):
+        '''Create the underlying requests session the first time it is needed.'''
+        if self.session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            retry = capped_retry()(
+                total=self.retries,
+                read=False,
+                backoff_factor=self.backoff,
+                backoff_max=self.max_backoff,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['GET'],
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            self.adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+            self.session = requests.Session()
+            self.session.headers.update({'Accept-Encoding': 'gzip', 'User-Agent': USER_AGENT})
+            self.session.mount('https://', self.adapter)
+            self.session.mount('http://', self.adapter)
+        return self.session
+
+    def get(self, url):
+        '''Send get request using a pooled connection.
+
+        :param url: Request URL.
+        :type url: str
+        :return: Server response.
+        :rtype: requests.Response
+        '''
+        return self.connect().get(url, timeout=self.timeout)
+
+    def stats(self):
+        '''Count connections opened & requests sent over reused connections.
+
+        :return: Number of new connections & number of reused connections.
+        :rtype: dict
+        '''
+        opened = 0
+        sent = 0
+        if self.adapter:
+            pools = self.adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                opened += pool.num_connections
+                sent += pool.num_requests
+        return {'new': opened, 'reused': sent - opened}
+
+    def close(self):
+        '''Close all pooled connections.'''
+        if self.session:
+            self.session.close()
+            self.session = None
+            self.adapter = None
+
+class Prefetcher:
+    '''This class fetches neighbouring pages of search results in the background.
+
+    Fetched pages are stored in the search cache, so paging to a prefetched page skips the network. If the 
+    user pages before a prefetch completes, the pending request is awaited instead of being sent twice.
+    '''
+    def __init__(self, workers=2):
+        self.workers = workers
+        self.executor = None
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self, type, term, start_index, page_size=PAGE_SIZE):
+        '''Start fetching a page of search results unless it is cached or already being fetched.'''
+        key = Search.cache.key(type, term, start_index, page_size)
+        with self.lock:
+            if key in self.pending or Search.cache.contains(key):
+                return
+            if self.executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch')
+            future = self.executor.submit(Search(page_size).get_page, type, term, start_index, False)
+            self.pending[key] = future
+        future.add_done_callback(lambda done: self.discard(key, done))
+
+    def discard(self, key, future):
+        '''Forget a completed or cancelled prefetch.'''
+        with self.lock:
+            if self.pending.get(key) is future:
+                del self.pending[key]
+
+    def wait(self, key):
+        '''Wait for an in-flight prefetch of the given page.
+
+        :return: Response data if page was being prefetched successfully; None if not.
+        :rtype: dict
+        '''
+        with self.lock:
+            future = self.pending.get(key)
+        if future is None or future.cancelled():
+            return None
+        try:
+            data = future.result()
+        except Exception:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def cancel(self):
+        '''Cancel prefetches that have not started yet.'''
+        with self.lock:
+            futures = list(self.pending.values())
+            self.pending = {}
+        for future in futures:
+            future.cancel()
+
+    def shutdown(self):
+        '''Cancel pending prefetches & stop worker threads.'''
+        self.cancel()
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+class BackgroundSearch:
+    '''This class runs a search on a background thread, so a slow response never freezes the session.
+
+    While the search runs, a spinner with the elapsed time is shown if output is a terminal. Pressing 
+    Ctrl-C cancels the search, and a search still running after deadline seconds is abandoned. Abandoned 
+    searches finish on their own daemon thread & their results are discarded.
+    '''
+    frames = '|/-\\'
+
+    def __init__(self, deadline=SEARCH_DEADLINE, interval=0.1):
+        self.deadline = deadline
+        self.interval = interval
+        self.shown = 0
+
+    def run(self, function, *args):
+        '''Call function with args on a background thread & wait for its result.
+
+        :param function: Function that performs search.
+        :type function: function
+        :return: Result of function, "Deadline Exceeded" if deadline passed, or None if user cancelled search.
+        :rtype: any
+        '''
+        done = threading.Event()
+        outcome = {}
+
+        def target():
+            try:
+                outcome['result'] = function(*args)
+            except BaseException as error:
+                outcome['error'] = error
+            finally:
+                done.set()
+
+        start = time.monotonic()
+        try:
+            threading.Thread(target=target, name='search', daemon=True).start()
+            while not done.wait(min(self.interval, max(self.deadline - (time.monotonic() - start), 0))):
+                elapsed = time.monotonic() - start
+                if elapsed >= self.deadline:
+                    return 'Deadline Exceeded'
+                self.show(elapsed)
+        except KeyboardInterrupt:
+            return None
+        finally:
+            self.clear()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def show(self, elapsed):
+        '''Print next frame of spinner over the previous one if output is a terminal.'''
+        if not sys.stdout.isatty():
+            return
+        frame = self.frames[int(elapsed / self.interval) % len(self.frames)]
+        line = f'{frame} Searching... {elapsed:.1f}s (press Ctrl-C to cancel)'
+        print(f'\r{line}', end='', flush=True)
+        self.shown = len(line)
+
+    def clear(self):
+        '''Erase spinner.'''
+        if self.shown:
+            print(f"\r{' ' * self.shown}\r", end='', flush=True)
+            self.shown = 0
+
+class TokenBucket:
+    '''This class limits how often requests are sent across threads.
+
+    Tokens are added at a steady rate up to capacity, and each request takes one, so requests can burst up 
+    to capacity at once but average no more than rate per second.
+    '''
+    def __init__(self, rate=API_RATE, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''Wait until a token is available & take it. A rate of 0 or None means requests are not limited.'''
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+class BatchSearch:
+    '''This class runs many searches concurrently, with a cap on requests in flight & a rate limit.
+
+    Each query is harvested with Search.harvest, so a query needing several pages requests them 
+    concurrently too, while the cap & rate limit apply to requests from all queries together. Pages are 
+    requested directly rather than through the search cache, so a large batch doesn't push the user's 
+    recent searches out of it.
+    '''
+    def __init__(self, workers=4, rate=API_RATE):
+        self.workers = workers
+        self.bucket = TokenBucket(rate, workers)
+        self.slots = threading.BoundedSemaphore(workers)
+
+    def run(self, queries):
+        '''Run queries concurrently & yield their results in the order the queries were given.
+
+        :param queries: Lists of [type, term, limit].
+        :type queries: iterable
+        :return: Result of each query; see query.
+        :rtype: generator
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='batch-search') as executor:
+            yield from executor.map(lambda query: self.query(*query), queries)
+
+    def query(self, type, term, limit):
+        '''Harvest up to limit books for one search.
+
+        :return: Search type & term, total matching books, up to limit Book objects, error message if a 
+        request failed & seconds taken, including time spent waiting for the rate limit.
+        :rtype: dict
+        '''
+        search = Search()
+        start = time.perf_counter()
+        books = list(search.harvest(type, term, limit, self.workers, self.request_page))
+        return {'type': type, 'term': term, 'total': search.total, 'books': books,
+                'error': search.errors[0] if search.errors else None, 'latency': time.perf_counter() - start}
+
+    def request_page(self, search, type, term, start_index):
+        '''Request one page once fewer than workers requests are in flight & the rate limit allows.'''
+        with self.slots:
+            self.bucket.acquire()
+            return search.request_page(type, term, start_index)
+
+class CoverCache:
+    '''This class stores cover thumbnails on disk, in files named by a hash of their contents.
+
+    Covers shared by several books, such as editions listed under different IDs, are stored once. An index 
+    maps each thumbnail URL to its file in least-recently-used order, and once the stored files take up 
+    more than max_bytes the least recently used URLs are evicted & files no URL refers to are deleted.
+    '''
+    extensions = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/gif': '.gif', 'image/webp': '.webp'}
+
+    def __init__(self, directory=COVER_DIR, max_bytes=COVER_CACHE_SIZE):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = None
+        self.lock = threading.RLock()
+
+    def load(self):
+        '''Read cache index from disk the first time the cache is used.'''
+        with self.lock:
+            if self.entries is None:
+                try:
+                    with open(os.path.join(self.directory, 'index.json')) as file:
+                        self.entries = json.load(file)
+                except (OSError, ValueError):
+                    self.entries = {}
+            return self.entries
+
+    def get(self, url):
+        '''Look up cached cover.
+
+        :param url: Thumbnail URL.
+        :type url: str
+        :return: Path of cached image, or None if not cached.
+        :rtype: str
+        '''
+        with self.lock:
+            entries = self.load()
+            entry = entries.pop(url, None)
+            if entry is None:
+                return None
+            path = os.path.join(self.directory, entry['file'])
+            if not os.path.exists(path):
+                return None
+            entries[url] = entry
+            return path
+
+    def put(self, url, content, content_type=''):
+        '''Store downloaded cover, evict least recently used covers & write index to disk.
+
+        :param url: Thumbnail URL.
+        :type url: str
+        :param content: Image data.
+        :type content: bytes
+        :param content_type: Content-Type header of response, used to pick file extension.
+        :type content_type: str
+        :return: Path of cached image.
+        :rtype: str
+        '''
+        import hashlib
+        extension = self.extensions.get(content_type.split(';')[0].strip().lower(), '')
+        entry = {'file': hashlib.sha256(content).hexdigest() + extension, 'size': len(content)}
+        path = os.path.join(self.directory, entry['file'])
+        with self.lock:
+            entries = self.load()
+            os.makedirs(self.directory, exist_ok=True)
+            if not os.path.exists(path):
+                write_atomic(path, content)
+            entries.pop(url, None)
+            entries[url] = entry
+            self.evict()
+            self.write()
+        return path
+
+    def evict(self):
+        '''Remove least recently used URLs until stored files fit in max_bytes, keeping the newest URL.'''
+        entries = self.load()
+        references = collections.Counter(entry['file'] for entry in entries.values())
+        size = self.size()
+        while size > self.max_bytes and len(entries) > 1:
+            entry = entries.pop(next(iter(entries)))
+            references[entry['file']] -= 1
+            if not references[entry['file']]:
+                size -= entry['size']
+                try:
+                    os.remove(os.path.join(self.directory, entry['file']))
+                except OSError:
+                    pass
+
+    def size(self):
+        '''Return bytes taken up by cached covers, counting each stored file once.'''
+        with self.lock:
+            return sum({entry['file']: entry['size'] for entry in self.load().values()}.values())
+
+    def write(self):
+        '''Write cache index to disk.'''
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomic(os.path.join(self.directory, 'index.json'), json.dumps(self.entries))
+
+class CoverDownloader:
+    '''This class downloads cover thumbnails for books into the cover cache, with a cap on requests in flight.
+
+    Each thumbnail URL is requested once even if several books share it, and covers already in the cache 
+    are not requested again.
+    '''
+    def __init__(self, cache=None, workers=COVER_WORKERS, session=None):
+        self.cache = cache or CoverCache()
+        self.workers = workers
+        self.session = session or ApiSession(pool_size=workers)
+
+    def download(self, books):
+        '''Download covers for books that are not already cached.
+
+        :param books: Book objects.
+        :type books: iterable
+        :return: Book ID, status (downloaded, cached, failed or missing if book has no thumbnail) & path of 
+        cached image or error message for each book, in the order given.
+        :rtype: list
+        '''
+        books = list(books)
+        urls = [url for url in dict.fromkeys(book.thumbnail for book in books if book.thumbnail)
+                if self.cache.get(url) is None]
+        fetched = {}
+        if urls:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='covers') as executor:
+                fetched = dict(zip(urls, executor.map(self.fetch, urls)))
+        results = []
+        for book in books:
+            if not book.thumbnail:
+                results.append({'id': book.id, 'status': 'missing'})
+            elif book.thumbnail in fetched:
+                (path, error) = fetched[book.thumbnail]
+                if error:
+                    results.append({'id': book.id, 'status': 'failed', 'error': error})
+                else:
+                    results.append({'id': book.id, 'status': 'downloaded', 'path': path})
+            else:
+                results.append({'id': book.id, 'status': 'cached', 'path': self.cache.get(book.thumbnail)})
+        return results
+
+    def fetch(self, url):
+        '''Download one cover into the cache.
+
+        :return: Path of cached image & None, or None & error message if request failed or response was 
+        not an image.
+        :rtype: tuple
+        '''
+        import requests
+        try:
+            response = self.session.get(url)
+        except requests.exceptions.Timeout:
+            return (None, 'Time Out')
+        except requests.exceptions.ConnectionError:
+            return (None, 'Connection Error')
+        except requests.exceptions.RequestException:
+            return (None, 'Exception')
+        profiler.count_response(response)
+        if response.status_code != 200:
+            return (None, f'{response.status_code} {response.reason}')
+        content_type = response.headers.get('Content-Type', '')
+        if not content_type.startswith('image/'):
+            return (None, f'Not an image: {content_type or "no Content-Type"}')
+        return (self.cache.put(url, response.content, content_type), None)
+
+class Profiler:
+    '''This class records how long a session spends on the network, on reading & writing lists & on output.
+
+    Profiling is off unless enabled with the --profile option or the BOOKS_PROFILE environment variable. 
+    Enabling it wraps File methods, API requests, result parsing & screen rendering with timers, so it 
+    costs nothing while off. Bytes read & written count JSON & journal files; the SQLite store is not counted.
+    '''
+    def __init__(self):
+        self.enabled = False
+        self.timings = {}
+        self.counters = {}
+        self.originals = []
+        self.profile = None
+        self.output = None
+        self.started = None
+        self.lock = threading.Lock()
+
+    def targets(self):
+        '''Return (owner, attribute name, label) of each function to time.'''
+        module = sys.modules[__name__]
+        # load_as_list is left out because it waits for the user to choose from the list's menu.
+        targets = [
+            (File, name, f'File.{name}') for (name, value) in vars(File).items()
+            if callable(value) and not name.startswith('__') and name != 'load_as_list'
+        ]
+        return targets + [
+            (Search, 'get_response', 'Search.get_response'),
+            (Search, 'format_search_results', 'Search.format_search_results'),
+            (module, 'print_header', 'render print_header'),
+            (module, 'display_books', 'render display_books'),
+            (SelectTarget, 'show_list', 'render SelectTarget.show_list'),
+        ]
+
+    def enable(self, output=None):
+        '''Start timing & counting.
+
+        :param output: File to write cProfile statistics to when session ends, or None to skip profiling.
+        :type output: str
+        '''
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.perf_counter()
+        for (owner, name, label) in self.targets():
+            function = getattr(owner, name)
+            self.originals.append((owner, name, function))
+            setattr(owner, name, self.timed(label, function))
+        if output:
+            import cProfile
+            self.output = output
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def disable(self):
+        '''Stop timing & restore the original functions.'''
+        if self.profile:
+            self.profile.disable()
+        for (owner, name, function) in reversed(self.originals):
+            setattr(owner, name, function)
+        self.originals = []
+        self.enabled = False
+
+    def timed(self, label, function):
+        '''Return function wrapped to record how long each call takes.'''
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(label, time.perf_counter() - start)
+        return wrapper
+
+    def record(self, label, seconds):
+        '''Add one call's duration to totals for label.'''
+        with self.lock:
+            timing = self.timings.setdefault(label, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def count(self, name, amount=1):
+        '''Add amount to named counter if profiling is enabled.'''
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count_file(self, name, file):
+        '''Add size of open file to named counter if profiling is enabled.'''
+        if self.enabled:
+            self.count(name, os.fstat(file.fileno()).st_size)
+
+    def count_response(self, response):
+        '''Count an API call & the bytes its response took to transfer, if profiling is enabled.'''
+        if self.enabled:
+            self.count('api calls')
+            self.count('api bytes', int(response.headers.get('Content-Length') or len(response.content)))
+
+    def report(self, stream=None):
+        '''Print timings & counters, slowest first, & write cProfile statistics if requested.'''
+        if not self.enabled:
+            return
+        stream = stream or sys.stderr
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.output)
+        print(f'\nProfile of {time.perf_counter() - self.started:.1f}s session', file=stream)
+        print(f"{'':<36} {'calls':>7} {'total ms':>10} {'mean ms':>9} {'max ms':>9}", file=stream)
+        for (label, [calls, total, longest]) in sorted(self.timings.items(), key=lambda item: -item[1][1]):
+            print(f'{label:<36} {calls:>7} {total * 1000:>10.1f} {total * 1000 / calls:>9.2f} {longest * 1000:>9.1f}', file=stream)
+        for (name, value) in sorted(self.counters.items()):
+            print(f'{name:<36} {value:>7}', file=stream)
+        if self.profile:
+            print(f'cProfile statistics written to {self.output}', file=stream)
+
+profiler = Profiler()
+
+class Output:
+    '''This class buffers interactive output & writes it out in one go when the user is asked for input.
+
+    While installed it stands in for sys.stdout, so headers, book lists & menus are collected & written 
+    with a single call just before each prompt (input() flushes sys.stdout). Styling is removed when output 
+    is not a terminal or the NO_COLOR environment variable is set. Pages of search results & reading lists 
+    show page_size books.
+    '''
+    styling = re.compile(r'\033\[[0-9;]*m')
+
+    def __init__(self, stream=None, pause=None, color=None, page_size=PAGE_SIZE):
+        self.stream = stream
+        self.chunks = []
+        self.pause_seconds = pause
+        self.color = color
+        self.page_size = page_size
+
+    def __getattr__(self, name):
+        return getattr(self.stream or sys.stdout, name)
+
+    @contextmanager
+    def installed(self):
+        '''Send everything printed to this buffer until the block ends.'''
+        previous = sys.stdout
+        self.stream = self.stream or previous
+        sys.stdout = self
+        try:
+            yield self
+        finally:
+            self.flush()
+            sys.stdout = previous
+
+    def write(self, text):
+        '''Add text to buffer.'''
+        self.chunks.append(text)
+        return len(text)
+
+    def flush(self):
+        '''Write buffered text to output stream.'''
+        stream = self.stream or sys.stdout
+        if self.chunks:
+            text = ''.join(self.chunks)
+            self.chunks = []
+            if not self.styled(stream):
+                text = self.styling.sub('', text)
+            stream.write(text)
+        stream.flush()
+
+    def styled(self, stream):
+        '''Check whether styling should be kept in text written to stream.'''
+        if self.color is not None:
+            return self.color
+        return stream.isatty() and 'NO_COLOR' not in os.environ
+
+    def pause(self):
+        '''Wait so user can read a message before the next screen is shown.
+
+        Pauses for pause_seconds if set, or else for one second when output is a terminal & not at all when 
+        it isn't, so scripted sessions run without delays.
+        '''
+        seconds = self.pause_seconds
+        if seconds is None:
+            seconds = 1 if (self.stream or sys.stdout).isatty() else 0
+        if seconds:
+            self.flush()
+            time.sleep(seconds)
+
+terminal = Output(pause=PAUSE, page_size=BOOKS_PER_PAGE)
+
+
 # These classes render menus. 
 
 class Menu:
@@ -151,28 +2532,33 @@ class Menu:
             id = style_output(i, 'header')
             print(f'{id} - {label}')
         print('\n')
-        self.select()
+        return self.select()
 
     def select(self):
-        '''Prompt user to select option and then execute selected action.'''
-        selection = input('Please enter your selection:  ')
-        valid = validate_selection(selection, self.options)
+        '''Prompt user to select option until a valid option is entered.
 
-        if valid:
-            option = self.options[int(selection) - 1]
-            self.options_dict[option][1]()
-        else:
+        The selected action is returned rather than called, so the screen it leads to is run by navigate 
+        after this screen has returned.
+
+        :return: Action for selected option.
+        :rtype: function
+        '''
+        selection = input('Please enter your selection:  ')
+        while not validate_selection(selection, self.options):
             print(style_output(
                 f'Invalid selection. Please choose from Options #1-{len(self.options)}.\n', 'warning'))
-            return self.select()
+            selection = input('Please enter your selection:  ')
+        option = self.options[int(selection) - 1]
+        return self.options_dict[option][1]
 
 class SelectTarget:
     '''This class generates menus that allow user to select a target to perform a given action.'''
-    def __init__(self, list, item, action, start_num=1):
+    def __init__(self, list, item, action, start_num=1, labels=None):
         self.list = list
         self.item = item
         self.action = action
         self.start_num = start_num
+        self.labels = labels
 
     def select_from_list(self):
         '''Print list of available targets and prompt user to select one option.'''
@@ -182,7 +2568,7 @@ class SelectTarget:
     def show_list(self):
         '''Print menu with available options.'''
         print(style_output(f'\n\nWhich {self.item} would you like to {self.action}?', 'underline'))
-        for (i, element) in enumerate(self.list, start=self.start_num):
+        for (i, element) in enumerate(self.labels or self.list, start=self.start_num):
             id = style_output(i, 'header')
             print(f'{id} - {element}')
         print('\n')    
@@ -190,37 +2576,35 @@ class SelectTarget:
     def prompt(self):
         '''Prompt user to select from list shown.'''
         num = input('Please enter your selection:  ')
-        valid = validate_selection(num, self.list, self.start_num)
-
-        if valid:
-            selected = self.list[int(num) - 1]
-            return selected
-        else:
+        while not validate_selection(num, self.list, self.start_num):
             print(style_output(
                 f'Invalid selection. Please choose from Options #1-{len(self.list)}.\n', 'warning'))
-            return self.prompt()
+            num = input('Please enter your selection:  ')
+        return self.list[int(num) - 1]
     
     def select_without_list(self):
         '''Prompt user for selection when options have already been printed.'''
-        num = input(f'Please enter the ID of the {self.item} you would like to {self.action}:  ')
-        valid = validate_selection(num, self.list, self.start_num)
-
-        if valid:
-            index = int(num) - int(self.start_num)
-            selected = self.list[index]
-            return selected
-        else:
+        prompt = f'Please enter the ID of the {self.item} you would like to {self.action}:  '
+        num = input(prompt)
+        while not validate_selection(num, self.list, self.start_num):
             end_num = int(self.start_num) + len(self.list) - 1
             print(style_output(
                 f'Invalid selection. Please choose from IDs #{self.start_num} - {end_num}.\n', 'warning'))
-            return self.select_without_list()
+            num = input(prompt)
+        index = int(num) - int(self.start_num)
+        return self.list[index]
 
 
 # These classes handle user navigation and lookups.
 
 class Search:
     '''This class performs a new search.'''
-    def __init__(self):
+    cache = SearchCache()
+    session = ApiSession()
+    prefetcher = Prefetcher()
+
+    def __init__(self, page_size=None):
+        self.page_size = min(max(int(page_size or terminal.page_size), 1), MAX_PAGE_SIZE)
         self.options = ['Title', 'Author', 'Subject', 'Keyword', 'Cancel search']
         self.query_dict = {
             'Title': '+intitle:',
@@ -231,27 +2615,31 @@ class Search:
 
     def build_query(self):
         '''This builds a search query based on user inputs.'''
+        self.prefetcher.cancel()
         type = self.get_type()
+        if type is None:
+            return main
         term = self.get_term(type) 
-        self.fetch(type, term)
+        return self.fetch(type, term)
 
     def get_type(self):
-        '''Prompt user to select a type of search.'''
+        '''Prompt user to select a type of search.
+
+        :return: Selected type of search, or None if user cancelled search.
+        :rtype: str
+        '''
         search_type = SelectTarget(self.options, 'type of search', 'perform').select_from_list()
-        if search_type == 'Cancel search and exit to home':
-            main()
-        else:
-            return search_type
+        if search_type == 'Cancel search':
+            return None
+        return search_type
 
     def get_term(self, type):
-        '''Prompt user to enter search term(s).'''
+        '''Prompt user to enter search term(s) until a non-empty term is entered.'''
         term = input(f'Please enter the {type.lower()} to search:  ')
-        
-        if term == '':
+        while term == '':
             print(style_output('Please enter a valid query.\n', 'warning'))
-            self.get_term(type)
-        else:
-            return term
+            term = input(f'Please enter the {type.lower()} to search:  ')
+        return term
 
     def fetch(self, type, term, start_index=0):
         '''Submit API get request & return response.
@@ -259,34 +2647,129 @@ class Search:
         Displays search results or error message with prompt to search again. If server responds with status 
         code not in 200 range: prints error message with specific status code and type. If requests module 
         raises exception, returns message with type if exception is ConnectionError, HTTPError or Timeout. 
-        If search returns no results, returns notification.
+        If search returns no results, returns notification. The request runs in the background, and if the 
+        user cancels it the search menu is shown again.
+
+        :return: Action selected by user after viewing results or error.
+        :rtype: function
+        '''
+        data = BackgroundSearch().run(self.get_page, type, term, start_index)
+
+        if data is None:
+            print(style_output('\nSearch cancelled.', 'warning'))
+            return Search(self.page_size).build_query
+        if isinstance(data, str):
+            self.display_error(data)
+            return self.search_again()
+
+        if data['totalItems'] == 0:
+            self.display_error('Sorry, your search returned 0 results.', 'no_results')
+            return self.search_again()
+        else: 
+            [results, total] = self.format_search_results(data)
+            return SearchResults(results, total, type, term, start_index, self.page_size).display_results()
+
+    def get_page(self, type, term, start_index=0, wait=True):
+        '''Return one page of search results from the search cache, a pending prefetch or the API.
+
+        :param wait: Whether to wait for a prefetch of the same page instead of sending a new request.
+        :type wait: boolean
+        :return: Response data, or error message if request failed.
+        :rtype: dict or str
+        '''
+        key = self.cache.key(type, term, start_index, self.page_size)
+        data = self.cache.get(key)
+        if data is None and wait:
+            data = self.prefetcher.wait(key)
+        if data is not None:
+            return data
+
+        data = self.request_page(type, term, start_index)
+        if isinstance(data, dict):
+            self.cache.put(key, data)
+        return data
+
+    def request_page(self, type, term, start_index=0):
+        '''Request one page of search results from the API, asking only for the fields that are displayed.
+
+        :return: Response data, or error message if request failed.
+        :rtype: dict or str
         '''
         search_query = f'{self.query_dict[type]}{term}'
-        url = f'https://www.googleapis.com/books/v1/volumes?q={search_query}&maxResults=5&startIndex={start_index}'
+        url = f'{API_URL}?q={search_query}&maxResults={self.page_size}&startIndex={start_index}&fields={API_FIELDS}'
 
         response = self.get_response(url)
 
         if response in ['Time Out', 'Connection Error', 'HTTP Error', 'Exception']:
-            self.display_error('Exception') 
-        
-        if response.status_code:
-            if response.status_code == 200:
-                if response.json()['totalItems'] == 0:
-                    self.display_error('Sorry, your search returned 0 results.', 'no_results')
-                    self.search_again()
-                else: 
-                    [results, total] = self.format_search_results(response.json())
-                    SearchResults(results, total, type, term, start_index).display_results()
-            else:
-                self.display_error(f'{response.status_code} {response.reason}')
-                self.search_again()
+            return response
+        if response.status_code != 200:
+            return f'{response.status_code} {response.reason}'
+        return response.json()
+
+    def harvest(self, type, term, limit, workers=4, request=None):
+        '''Fetch up to limit search results using concurrent requests for pages of up to MAX_PAGE_SIZE.
+
+        Results are yielded as each page arrives, so pages may complete out of order. Books returned on 
+        more than one page are only yielded once. Pages that fail are skipped & their errors are stored 
+        in self.errors. The total number of matching books is stored in self.total.
+
+        :param limit: Maximum number of results to fetch.
+        :type limit: int
+        :param workers: Maximum number of requests in flight.
+        :type workers: int
+        :param request: Function called with a Search object, type, term & start index to request each 
+        page, such as one that limits requests shared by several harvests; defaults to Search.request_page.
+        :type request: function
+        :return: Book objects representing search results.
+        :rtype: generator
+        '''
+        harvester = Search(min(max(int(limit), 1), MAX_PAGE_SIZE))
+        request = request or (lambda search, *args: search.request_page(*args))
+        self.errors = []
+        self.total = 0
+        seen = set()
+
+        first = request(harvester, type, term, 0)
+        yield from self.harvest_page(first, seen, limit)
+        if isinstance(first, str):
+            return
+        self.total = first['totalItems']
+        starts = range(harvester.page_size, min(self.total, limit), harvester.page_size)
+        if not starts or len(seen) >= limit:
+            return
+
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='harvest') as executor:
+            futures = [executor.submit(request, harvester, type, term, start) for start in starts]
+            try:
+                for future in as_completed(futures):
+                    if len(seen) >= limit:
+                        break
+                    yield from self.harvest_page(future.result(), seen, limit)
+            finally:
+                for future in futures:
+                    future.cancel()
+
+    def harvest_page(self, data, seen, limit):
+        '''Yield books from one harvested page that have not been seen yet.'''
+        if isinstance(data, str):
+            self.errors.append(data)
+            return
+        for book in self.format_search_results(data)[0]:
+            if len(seen) >= limit:
+                return
+            if book.id not in seen:
+                seen.add(book.id)
+                yield book
 
     def get_response(self, url):
         '''Send get request to Google Books API containing user's search query & start index if not new search.'''
+        import requests
         try:
-            response = requests.get(url)
+            response = self.session.get(url)
+            profiler.count_response(response)
             return response
-        except requests.exceptions.Timeout or requests.exceptions.ReadTimeout or requests.exceptions.ConnectTimeout:
+        except requests.exceptions.Timeout:
             return 'Time Out'
         except requests.exceptions.HTTPError:
             return 'HTTP Error'
@@ -303,13 +2786,16 @@ class Search:
             print(style_output(f'Sorry, your search could not be completed. Please try again later or with a different query. (Error: {err})', 'warning'))
         
     def search_again(self):
-        '''Prompt user to begin a new search after search failure.'''
+        '''Prompt user to begin a new search after search failure.
+
+        :return: Action to start a new search, or to return to home page.
+        :rtype: function
+        '''
         print('\nWould you like to start a new search?')
         confirm = input('Please enter "y" to search or any other key to exit:  ')
         if confirm == 'y':
-            Search().build_query()
-        else:
-            main()
+            return Search().build_query
+        return main
 
     def format_search_results(self, data):
         '''Extract relevant information from API response data & save items as Book instances.
@@ -321,28 +2807,53 @@ class Search:
         '''
         total = data['totalItems']
         results = []
-        for item in data['items']:
-            id = item['id']
-            if 'title' not in item['volumeInfo']:
-                title = ''
-            else:
-                title = item['volumeInfo']['title']
-            if 'authors' not in item['volumeInfo']:
-                author = ''
-            else:
-                author = ', '.join(item['volumeInfo']['authors'])
-            if 'publisher' not in item['volumeInfo']:
-                publisher = ''
-            else:
-                publisher = item['volumeInfo']['publisher']
-            result = Book(id, title, author, publisher)
-            results.append(result)
+        for item in data.get('items', []):
+            info = item.get('volumeInfo', {})
+            author = ', '.join(info.get('authors', ()))
+            images = info.get('imageLinks', {})
+            thumbnail = images.get('thumbnail') or images.get('smallThumbnail', '')
+            results.append(Book(item['id'], info.get('title', ''), author, info.get('publisher', ''), thumbnail))
         return [results, total]
 
+class ListSearch:
+    '''This class searches books saved to all reading lists & displays results.'''
+    def __init__(self):
+        self.options_dict = {
+            'new': ['Search my lists again', self.build_query],
+            'lists': ['Go to my reading lists', lists_landing],
+            'exit': ['Exit to home', main],
+        }
+
+    def build_query(self):
+        '''Prompt user for search terms & display matching saved books.'''
+        term = input('Please enter the title, author or publisher to search for:  ').strip()
+        while term == '':
+            print(style_output('Please enter a valid query.\n', 'warning'))
+            term = input('Please enter the title, author or publisher to search for:  ').strip()
+        return self.display_results(term, File.search_index.search(term))
+
+    def display_results(self, term, results):
+        '''Print saved books matching search terms along with the list each is saved to.
+
+        :param results: List of [list name, Book] pairs.
+        :type results: list
+        '''
+        print_header('my lists search results')
+        if not results:
+            print(style_output(f'\nNo saved books match "{term}".', 'warning'))
+        else:
+            print(style_output(f'\nShowing {len(results)} saved books matching "{term}":\n', 'underline'))
+            for (i, [list_name, book]) in enumerate(results, start=1):
+                print(style_output(f'ID {i}', 'header'))
+                book.print()
+                print(f'    List: {list_name}')
+        return Menu(['new', 'lists', 'exit'], self.options_dict).print()
+
 class SearchResults:
     '''This class displays search results & handles relevant actions.'''
-    def __init__(self, results, total, type, query, start_index=0):
+    def __init__(self, results, total, type, query, start_index=0, page_size=PAGE_SIZE):
         self.results = results
+        self.page_size = page_size
         self.total = total
         self.type = type
         self.query = query
@@ -350,30 +2861,31 @@ class SearchResults:
         self.first = int(self.start_index) + 1
         self.last = self.first + len(self.results) - 1
         self.options_dict = {
-            'prev': ['Show previous 5 results', self.prev],
-            'next': ['Show next 5 results', self.next],
+            'prev': [f'Show previous {page_size} results', self.prev],
+            'next': [f'Show next {page_size} results', self.next],
             'save': ['Save a book to my reading lists', self.save],
+            'covers': ['Download covers for these results', self.covers],
             'new': ['Start a new search', Search().build_query],
             'exit': ['Exit to home', main],
         }
 
     def menu(self):
         '''Populate menu options depending on contents of search results.'''
-        options = ['prev', 'next', 'save', 'new', 'exit']
+        options = ['prev', 'next', 'save', 'covers', 'new', 'exit']
         if self.first == 1:
             options.remove('prev')
         if self.last == self.total:
             options.remove('next')
-        Menu(options, self.options_dict).print()
+        return Menu(options, self.options_dict).print()
 
     def next(self):
         '''Fetch next page of search results.'''
-        Search().fetch(self.type, self.query, self.last)
+        return Search(self.page_size).fetch(self.type, self.query, self.last)
     
     def prev(self):
         '''Fetch previous page of search results.'''
-        new_start = int(self.start_index) - 5
-        Search().fetch(self.type, self.query, new_start)
+        new_start = max(int(self.start_index) - self.page_size, 0)
+        return Search(self.page_size).fetch(self.type, self.query, new_start)
     
     def display_results(self):
         '''Print formatted search results & new menu options.
@@ -388,8 +2900,18 @@ class SearchResults:
             print(style_output(f'\nShowing 1 result matching {self.type.lower()}: "{self.query}"\n', 'underline'))
         else:
             print(style_output(f'\nShowing {self.first} - {self.last} of {self.total} results matching {self.type}: "{self.query}"\n', 'underline'))
-        display_books(self.results, self.first)
-        self.menu()
+        saved = File.saved_index.lookup([book.id for book in self.results])
+        display_books(self.results, self.first, saved)
+        self.prefetch()
+        return self.menu()
+
+    def prefetch(self):
+        '''Fetch adjacent pages of search results in the background while user reads this one.'''
+        if self.last < self.total:
+            Search.prefetcher.prefetch(self.type, self.query, self.last, self.page_size)
+        if self.first > 1:
+            new_start = max(int(self.start_index) - self.page_size, 0)
+            Search.prefetcher.prefetch(self.type, self.query, new_start, self.page_size)
 
     def save(self):
         '''Save selected book to reading list.
@@ -398,16 +2920,27 @@ class SearchResults:
         :type search_results: list
         '''
         target_book = SelectTarget(self.results, 'book', 'save', self.first).select_without_list()
-        target_list = SelectTarget(ListsMain().lists, 'list', 'save to').select_from_list()
+        saved_to = {File.saved_index.key(name) for name in File.saved_index.lists_containing(target_book.id)}
+        lists = [name for name in ListsMain().lists if File.saved_index.key(name) not in saved_to]
+        if not lists:
+            print(style_output(f'{target_book.title} is already saved to all of your reading lists.', 'warning'))
+            terminal.pause()
+            return self.menu()
+        target_list = SelectTarget(lists, 'list', 'save to').select_from_list()
         saved_book = File(target_list).save(target_book)
         
         if saved_book:
             print(style_output(f'Saved to "{target_list}": {repr(target_book)}', 'success'))
-            time.sleep(1)
+            terminal.pause()
         else:
             print(style_output(f'Unable to save to "{target_list}": {target_book.title} is already saved to this list.', 'warning'))
-            time.sleep(1)
-        self.menu()
+            terminal.pause()
+        return self.menu()
+
+    def covers(self):
+        '''Download cover thumbnails for this page of search results.'''
+        download_covers(self.results)
+        return self.menu()
 
 class ListsMain:
     '''This class handles navigation from the main Reading Lists page.'''
@@ -422,100 +2955,162 @@ class ListsMain:
 
     def menu(self):
         '''Print Reading Lists menu.'''
-        Menu(self.options, self.options_dict).print()
+        return Menu(self.options, self.options_dict).print()
 
     def view_list(self):
         '''Prompt user to select list and then load associated file.'''
-        list = SelectTarget(list_all_lists(), 'list', 'view').select_from_list()
-        File(list).load_as_list()
+        names = list_all_lists()
+        labels = [File.catalog.label(name) for name in names]
+        list = SelectTarget(names, 'list', 'view', labels=labels).select_from_list()
+        return File(list).load_as_list()
 
     def create_list(self):
         '''Prompt user to enter name for new list and validate input. Create new list or 
         display error message and repeat prompt if name is invalid.'''
-        name = input('Please enter a name for the new list:  ').strip()
-        if name:
+        while True:
+            name = input('Please enter a name for the new list:  ').strip()
+            if not name:
+                continue
             status = File(name).create()
 
             if status == 'success':
                 print(style_output(f'New list "{name}" created.', 'success'))
-                time.sleep(1)
-                self.menu()
+                terminal.pause()
+                return self.menu()
             elif status == 'duplicate':
                 print(style_output(f'List could not be created: "{name}" already exists.\n', 'warning'))
-                self.create_list()
             elif status == 'invalid':
                 print(style_output(f'List could not be created: "{name}" contains invalid characters. (Only alphanumeric characters and spaces allowed.)\n', 'warning'))
-                self.create_list()
-        else: 
-            return self.create_list()
 
 class List:
-    '''This class displays a selected reading list & handles relevant actions.'''
-    def __init__(self, name, booklist):
+    '''This class displays a page of a selected reading list & handles relevant actions.'''
+    def __init__(self, name, booklist, start_index=0, more=False, view=None):
         self.name = name
         self.booklist = booklist
+        self.start_index = start_index
+        self.more = more
+        self.view = view or ListView()
+        self.page_size = terminal.page_size
+        self.first = start_index + 1
+        self.last = start_index + len(booklist)
         self.options_dict = {
+            'prev': [f'Show previous {self.page_size} books', self.prev],
+            'next': [f'Show next {self.page_size} books', self.next],
+            'sort': ['Sort this list', self.sort],
+            'filter': ['Filter this list', self.filter],
+            'clear_filter': ['Show all books in this list', self.clear_filter],
             'delete_book': ['Delete a book from this list', self.delete_book],
             'move_book': ['Move a book to another list', self.move_book],
+            'covers': ['Download covers for this list', self.covers],
             'delete_list': ['Delete this list', self.delete_list],
-            'view_another': ['View another list', ListsMain().view_list],
-            'new_list': ['Create a new list', ListsMain().create_list],
+            'view_another': ['View another list', self.view_another],
+            'new_list': ['Create a new list', self.new_list],
             'exit': ['Exit to home', main],
         }
 
     def menu(self):
         '''Populate menu options depending on contents of list.'''
-        options = ['delete_book', 'move_book', 'delete_list', 'view_another', 'new_list', 'exit']
+        options = ['prev', 'next', 'sort', 'filter', 'clear_filter', 'delete_book', 'move_book', 'covers',
+                   'delete_list', 'view_another', 'new_list', 'exit']
+        if self.start_index == 0:
+            options.remove('prev')
+        if not self.more:
+            options.remove('next')
+        if not self.view.text:
+            options.remove('clear_filter')
+            if not self.booklist:
+                options.remove('sort')
+                options.remove('filter')
         if self.name == 'reading list':
             options.remove('delete_list')
         if not self.booklist:
             options.remove('move_book')
             options.remove('delete_book')
-        Menu(options, self.options_dict).print()
+            options.remove('covers')
+        return Menu(options, self.options_dict).print()
 
     def display(self):
-        '''Print reading list & menu of relevant actions.'''
+        '''Print page of reading list & menu of relevant actions.'''
         print_header(self.name)
-        if len(self.booklist) == 0:
+        if len(self.booklist) == 0 and self.view.text:
+            print(style_output(f'\nThere are no books in "{self.name}" {self.view.matching()}.', 'warning'))
+        elif len(self.booklist) == 0:
             print(style_output(f'\nThere are currently no books in "{self.name}".', 'warning'))
-            options = ['delete_list', 'view_another', 'new_list', 'exit']
-            Menu(options, self.options_dict).print() 
         else:
-            print(style_output(f'\nShowing books in "{self.name}":\n', 'underline'))
-            display_books(self.booklist)
-            options = ['delete_book', 'move_book', 'delete_list', 'view_another', 'new_list', 'exit']
-            Menu(options, self.options_dict).print() 
+            description = f' ({self.view.describe()})' if not self.view.is_default() else ''
+            print(style_output(f'\nShowing books {self.first} - {self.last} in "{self.name}"{description}:\n', 'underline'))
+            display_books(self.booklist, self.first)
+        return self.menu()
+
+    def view_another(self):
+        '''Prompt user to select another list to view.'''
+        return ListsMain().view_list()
+
+    def new_list(self):
+        '''Prompt user to create a new list.'''
+        return ListsMain().create_list()
+
+    def next(self):
+        '''Show next page of reading list.'''
+        return File(self.name).load_as_list(self.last, self.view)
+
+    def prev(self):
+        '''Show previous page of reading list.'''
+        return File(self.name).load_as_list(max(self.start_index - self.page_size, 0), self.view)
+
+    def sort(self):
+        '''Prompt user to select sort order & show first page of list in that order.'''
+        order = SelectTarget(list(ListView.sorts), 'sort order', 'use').select_from_list()
+        view = ListView(ListView.sorts[order], self.view.field, self.view.text, self.view.prefix)
+        return File(self.name).load_as_list(0, view)
+
+    def filter(self):
+        '''Prompt user to select field & enter text to match, then show first page of matching books.'''
+        choice = SelectTarget(list(ListView.filters), 'filter', 'apply').select_from_list()
+        (field, prefix) = ListView.filters[choice]
+        text = input('Please enter the text to match:  ')
+        while text.strip() == '':
+            print(style_output('Please enter some text to match.\n', 'warning'))
+            text = input('Please enter the text to match:  ')
+        return File(self.name).load_as_list(0, ListView(self.view.sort, field, text.strip(), prefix))
+
+    def clear_filter(self):
+        '''Show first page of whole list in current sort order.'''
+        return File(self.name).load_as_list(0, ListView(self.view.sort))
 
     def move_book(self):
         '''Move a book to a different reading list.'''
-        target_book = SelectTarget(self.booklist, 'book', 'move').select_without_list()
+        target_book = SelectTarget(self.booklist, 'book', 'move', self.first).select_without_list()
         target_list = SelectTarget(ListsMain().lists, 'list', 'move to').select_from_list()
 
-        saved_book = File(target_list).save(target_book)
-        if saved_book:
-            File(self.name).delete_record(target_book)
+        moved_book = File(self.name).move_record(target_book, target_list)
+        if moved_book:
             print(style_output(f'\nMoved to "{target_list}": {repr(target_book)}', 'success'))
             print(f'Refreshing "{self.name}"...')
-            time.sleep(1)
-            File(self.name).load_as_list()
+            terminal.pause()
+            return File(self.name).load_as_list(self.start_index, self.view)
         else:
             print(style_output(f'Unable to move to "{target_list}": {target_book.title} is already saved to this list.', 'warning'))
-            options = ['delete_book', 'move_book', 'delete_list', 'view_another', 'new_list', 'exit']
-            Menu(options, self.options_dict).print() 
+            return self.menu()
+
+    def covers(self):
+        '''Download cover thumbnails for every book in this list.'''
+        download_covers(File(self.name).iter_books())
+        return self.menu()
 
     def delete_book(self):
         '''Delete a book saved to a reading list.'''
-        book = SelectTarget(self.booklist, 'book', 'delete').select_without_list()
+        book = SelectTarget(self.booklist, 'book', 'delete', self.first).select_without_list()
         confirmed = self.confirm_delete(book.title)
         if confirmed:
             File(self.name).delete_record(book)
             print(style_output(f'\nDeleted from "{self.name}": {repr(book)}', 'success'))
             print(f'Refreshing "{self.name}"...')
-            time.sleep(1)
-            File(self.name).load_as_list()
+            terminal.pause()
+            return File(self.name).load_as_list(self.start_index, self.view)
         else: 
             print('Delete cancelled.')
-            self.menu()
+            return self.menu()
         
     def delete_list(self):
         '''Delete JSON file of selected list'''
@@ -523,11 +3118,11 @@ class List:
         if confirmed:
             File(self.name).delete_file()
             print(style_output(f'List "{self.name}" deleted.', 'success'))
-            time.sleep(1)
-            ListsMain().menu()
+            terminal.pause()
+            return ListsMain().menu()
         else:
             print('Delete cancelled.')
-            self.menu()
+            return self.menu()
 
     def confirm_delete(self, item):
         '''Prompt user to confirm deletion of a book or list.'''
@@ -552,6 +3147,113 @@ def print_header(name):
     print(f" {style_output(border2, 'border')}")
     print(f'   {border}\n')
 
+def download_covers(books):
+    '''Download cover thumbnails for books & print how many were downloaded, already cached or unavailable.'''
+    downloader = CoverDownloader()
+    print('Downloading covers...')
+    try:
+        results = downloader.download(books)
+    finally:
+        downloader.session.close()
+    counts = collections.Counter(result['status'] for result in results)
+    print(style_output(f"Covers saved to {downloader.cache.directory}: {counts['downloaded']} downloaded, "
+                       f"{counts['cached']} already cached", 'success'))
+    if counts['failed'] or counts['missing']:
+        print(style_output(f"{counts['failed']} could not be downloaded & {counts['missing']} have no cover.", 'warning'))
+    terminal.pause()
+
+def write_atomic(path, text):
+    '''Write text to a temporary file & then rename it over path, so readers never see a partial file.
+
+    :param path: File to replace.
+    :type path: str
+    :param text: New file contents.
+    :type text: str or bytes
+    '''
+    temp = write_temp(path, text)
+    try:
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+def write_temp(path, text):
+    '''Durably write text or bytes to a new temporary file in the same directory as path.
+
+    The temporary file is given the permissions of the file at path, or those a newly created file would 
+    have, since mkstemp makes files only their owner can read & renaming keeps that mode.
+
+    :return: Path of temporary file.
+    :rtype: str
+    '''
+    (fd, temp) = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.', suffix='.tmp')
+    profiler.count('bytes written', len(text))
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(text, bytes) else 'w') as file:
+            file.write(text)
+            file.flush()
+            os.fsync(file.fileno())
+        os.chmod(temp, file_mode(path))
+    except BaseException:
+        os.remove(temp)
+        raise
+    return temp
+
+def file_mode(path):
+    '''Return permission bits of file at path, or of a new file created with the current umask if it does not exist.'''
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~default_umask()
+
+@functools.lru_cache(maxsize=None)
+def default_umask():
+    '''Return process umask. It can only be read by setting it, so it is read once & then restored.'''
+    umask = os.umask(0o022)
+    os.umask(umask)
+    return umask
+
+def iter_json_array(file, chunk_size=65536):
+    '''Yield elements of the first JSON array in a file one at a time, reading the file in chunks.
+
+    Only the unread part of the current chunk & the element being decoded are held in memory, so very 
+    large files can be read without loading them whole. Elements must be strings, objects or arrays, since 
+    a number split across two chunks would be decoded early.
+
+    :param file: Open text file.
+    :type file: file obj
+    :param chunk_size: Number of characters to read at a time.
+    :type chunk_size: int
+    :return: Decoded array elements.
+    :rtype: generator
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = -1
+    while pos == -1:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        buffer += chunk
+        pos = buffer.find('[')
+    pos += 1
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            (value, pos) = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield value
+
 def validate_selection(val, list, start_num=1):
     '''Validate that a user selection is an available menu option.
     
@@ -573,17 +3275,21 @@ def validate_selection(val, list, start_num=1):
         except ValueError:
             return False
 
-def display_books(list, start_num=1):
+def display_books(list, start_num=1, saved=None):
     '''Print list of books as a numbered, formatted list.
         
-    :param list: List of Book objects.
-    :type list: list
+    :param list: Books to print.
+    :type list: list or BookList
+    :param saved: Names of lists each book is already saved to, keyed by book ID.
+    :type saved: dict
     :return: Numbered, formatted list.
     :rtype: str
     '''
     for (i, book) in enumerate(list, start=start_num):
         print(style_output(f'ID {i}', 'header'))
         book.print()
+        if saved and book.id in saved:
+            print(style_output(f"    Saved to: {', '.join(saved[book.id])}", 'success'))
 
 def style_output(string, style):
     '''Apply text styling to terminal output.
@@ -608,13 +3314,7 @@ def style_output(string, style):
 
 def list_all_lists():
     '''Return all reading list files as formatted list of names.'''
-    list_names = os.listdir('./lists')
-    clean_list = []
-
-    for list in list_names:
-        name = list.split('.')[0].replace("_", " ")
-        clean_list.append(name)
-    return clean_list
+    return File.catalog.names()
 
 
 # These functions print headers and the main navigation menus.
@@ -622,30 +3322,315 @@ def list_all_lists():
 def search_landing():
     '''Display search header & user_selections user for query.'''
     print_header('search')
-    Search().build_query()
+    return Search(terminal.page_size).build_query()
+
+def my_lists_search_landing():
+    '''Display search header & prompt user for query to search saved books.'''
+    print_header('search my lists')
+    return ListSearch().build_query()
 
 def lists_landing():
     '''Display reading list header & print saved books.'''
     print_header('my reading lists')
-    ListsMain().menu()
+    return ListsMain().menu()
 
 def quit_landing():
-    '''Displays quit header & goodbye message.'''
+    '''Displays quit header & goodbye message. Returns no action, which ends the session.'''
     print_header('quit')
     print(style_output('\nThanks for using Books on 8th! Goodbye.\n', 'success'))
+    Search.prefetcher.shutdown()
+    Search.session.close()
+    File.saved_index.write()
+    File.sort_index.write()
+    sys.stdout.flush()
+    profiler.report()
 
 def main():
-    '''Displays homepage header & menu.'''
+    '''Displays homepage header & menu.
+
+    :return: Action selected by user.
+    :rtype: function
+    '''
     print_header('home')
     print(style_output('\n      Welcome to Books on 8th!', 'header'))
-    options = ['search', 'list', 'quit']
+    options = ['search', 'search_lists', 'list', 'quit']
     options_dict = {
             'search': ['Search for books', search_landing],
+            'search_lists': ['Search my lists', my_lists_search_landing],
             'list': ['Go to my reading lists', lists_landing],
             'quit': ['Quit', quit_landing],
         }
-    Menu(options, options_dict).print()
+    return Menu(options, options_dict).print()
+
+def navigate(action=main):
+    '''Run actions selected by user until user quits.
+
+    Each screen returns the next action instead of calling it, so the call stack stays the same depth & 
+    only the current screen is kept in memory however long the session runs.
+
+    :param action: First action to run.
+    :type action: function
+    '''
+    while action is not None:
+        action = action()
+
+
+# These functions run batch commands from the command line, reading & writing one JSON record per line.
+
+def read_jsonl(stream):
+    '''Yield records decoded from lines of JSON, skipping blank lines & reporting invalid ones.'''
+    for (number, line) in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            print(f'Skipping line {number}: invalid JSON', file=sys.stderr)
+
+def write_jsonl(stream, record):
+    '''Write record to stream as one line of JSON.'''
+    stream.write(json.dumps(record) + '\n')
+
+def read_books(stream):
+    '''Yield Book objects from JSON records in stream, reporting records without an ID or with fields that are not strings.'''
+    for record in read_jsonl(stream):
+        if not isinstance(record, dict) or not is_id(record.get('id')):
+            print(f'Skipping record without id: {json.dumps(record)}', file=sys.stderr)
+            continue
+        fields = [record.get(field, '') for field in ['title', 'author', 'publisher', 'thumbnail']]
+        if not all(isinstance(field, str) for field in fields):
+            print(f'Skipping record with invalid fields: {json.dumps(record)}', file=sys.stderr)
+            continue
+        yield Book(record['id'], *fields)
+
+def read_ids(stream):
+    '''Yield book IDs from JSON records in stream, which may be book records or bare ID strings.'''
+    for record in read_jsonl(stream):
+        if is_id(record):
+            yield record
+        elif isinstance(record, dict) and is_id(record.get('id')):
+            yield record['id']
+        else:
+            print(f'Skipping record without id: {json.dumps(record)}', file=sys.stderr)
+
+def is_id(value):
+    '''Return True if value is a non-empty string that can be used as a book ID.'''
+    return isinstance(value, str) and bool(value)
+
+def batched(records, size):
+    '''Yield lists of up to size records.'''
+    records = iter(records)
+    while batch := list(itertools.islice(records, size)):
+        yield batch
+
+def find_list(name):
+    '''Return name of existing reading list matching name, ignoring case & underscores, or None.'''
+    wanted = name.replace('_', ' ').lower()
+    for list_name in list_all_lists():
+        if list_name.lower() == wanted:
+            return list_name
+    return None
+
+def open_list(name):
+    '''Return File for existing reading list, or None after reporting that list does not exist.'''
+    list_name = find_list(name)
+    if list_name is None:
+        print(f"No reading list named '{name}'", file=sys.stderr)
+        return None
+    return File(list_name)
+
+def run_search(args, input, output):
+    '''Search for each query & write one record per book found.
+
+    Queries are taken from the command line, or else read from input as JSON strings or as records with 
+    a term & optional type & limit. Queries run concurrently, but results are written in query order.
+    '''
+    queries = [' '.join(args.terms)] if args.terms else read_jsonl(input)
+    batch = BatchSearch(args.workers, args.rate)
+    status = 0
+    for result in batch.run(read_queries(queries, args)):
+        for book in result['books']:
+            write_jsonl(output, {'type': result['type'], 'term': result['term'], **book.to_dict()})
+        if result['error']:
+            print(f"Search for {result['type'].lower()} '{result['term']}' failed: {result['error']}", file=sys.stderr)
+            status = 1
+        if args.stats:
+            stats = {key: result[key] for key in ['type', 'term', 'total', 'error']}
+            stats.update(found=len(result['books']), latency_ms=round(result['latency'] * 1000, 1))
+            print(json.dumps(stats), file=sys.stderr)
+    return status
+
+def read_queries(queries, args):
+    '''Yield [type, term, limit] for each valid query, reporting invalid ones.'''
+    for query in queries:
+        if isinstance(query, str):
+            query = {'term': query}
+        if isinstance(query, dict):
+            type = str(query.get('type', args.type)).title()
+            term = query.get('term')
+            limit = query.get('limit', args.limit)
+            # bool is a subclass of int, but true is not a limit.
+            valid_limit = isinstance(limit, int) and not isinstance(limit, bool) and limit > 0
+            if type in Search().query_dict and isinstance(term, str) and term.strip() and valid_limit:
+                yield [type, term, limit]
+                continue
+        print(f'Skipping invalid query: {json.dumps(query)}', file=sys.stderr)
+
+def run_save(args, input, output):
+    '''Save books read from input to reading list & write the outcome for each book.'''
+    if args.command == 'import' and find_list(args.list) is None:
+        if File(args.list).create() == 'invalid':
+            print(f"Invalid reading list name '{args.list}'", file=sys.stderr)
+            return 1
+    file = open_list(args.list)
+    if file is None:
+        return 1
+    for batch in batched(read_books(input), args.batch_size):
+        saved = {book.id for book in file.save_records(batch)}
+        for book in batch:
+            write_jsonl(output, {'id': book.id, 'list': file.list_name, 'status': 'saved' if book.id in saved else 'duplicate'})
+            saved.discard(book.id)
+    return 0
+
+def run_delete(args, input, output):
+    '''Delete books with IDs read from input from reading list & write the outcome for each ID.'''
+    file = open_list(args.list)
+    if file is None:
+        return 1
+    for batch in batched(read_ids(input), args.batch_size):
+        deleted = file.delete_records(batch)
+        for id in batch:
+            write_jsonl(output, {'id': id, 'list': file.list_name, 'status': 'deleted' if id in deleted else 'missing'})
+            deleted.discard(id)
+    return 0
+
+def run_move(args, input, output):
+    '''Move books with IDs read from input to target list & write the outcome for each ID.'''
+    file = open_list(args.list)
+    target = open_list(args.target)
+    if file is None or target is None:
+        return 1
+    for batch in batched(read_ids(input), args.batch_size):
+        moved = {book.id for book in file.move_records([Book(id, '', '', '') for id in batch], target.list_name)}
+        for id in batch:
+            write_jsonl(output, {'id': id, 'list': target.list_name, 'status': 'moved' if id in moved else 'skipped'})
+            moved.discard(id)
+    return 0
+
+def run_export(args, input, output):
+    '''Write every book in the named reading lists, or in all lists, as one record per book.'''
+    files = [open_list(name) for name in args.lists] if args.lists else [File(name) for name in list_all_lists()]
+    if None in files:
+        return 1
+    for file in files:
+        for book in file.iter_books():
+            write_jsonl(output, {'list': file.list_name, **book.to_dict()})
+    return 0
+
+def run_covers(args, input, output):
+    '''Download cover thumbnails for books in a reading list, or read from input, & write the outcome for each book.'''
+    if args.list:
+        file = open_list(args.list)
+        if file is None:
+            return 1
+        books = file.iter_books()
+    else:
+        books = read_books(input)
+    downloader = CoverDownloader(CoverCache(args.cache_dir, args.cache_size * 1024 * 1024), args.workers)
+    try:
+        results = downloader.download(books)
+    finally:
+        downloader.session.close()
+    for result in results:
+        write_jsonl(output, result)
+    return 1 if any(result['status'] == 'failed' for result in results) else 0
+
+def build_parser():
+    '''Return parser for batch commands.'''
+    parser = argparse.ArgumentParser(
+        prog='main.py', description='Run Books on 8th commands on streams of JSON lines. Run without a command to browse interactively.')
+    parser.add_argument('--profile', action='store_true', help='print time spent in API requests, list files & output on exit')
+    parser.add_argument('--profile-output', metavar='FILE', help='also write cProfile statistics to FILE')
+    parser.add_argument('--pause', type=seconds, metavar='SECONDS', help='pause after confirmation messages (default: 1 on a terminal, otherwise 0)')
+    parser.add_argument('--page-size', type=page_size, metavar='BOOKS',
+                        help=f'books shown per page of search results & lists (default: {PAGE_SIZE}, at most {MAX_PAGE_SIZE})')
+    parser.add_argument('--no-color', action='store_true', help='print without colors & styling')
+    commands = parser.add_subparsers(dest='command')
+
+    search = commands.add_parser('search', help='search for books & write one result per line')
+    search.add_argument('terms', nargs='*', help='search term; if omitted, queries are read from stdin')
+    search.add_argument('--type', default='Keyword', help='title, author, subject or keyword (default: keyword)')
+    search.add_argument('--limit', type=int, default=SEARCH_LIMIT, help='maximum results per query')
+    search.add_argument('--workers', type=int, default=4, help='maximum requests in flight')
+    search.add_argument('--rate', type=float, default=API_RATE, help='maximum requests per second; 0 for no limit')
+    search.add_argument('--stats', action='store_true', help='write total, results found & latency of each query to stderr')
+    search.set_defaults(run=run_search)
+
+    batch_commands = []
+    for (name, help) in [('save', 'save books read from stdin to an existing list'),
+                         ('import', 'save books read from stdin to a list, creating it if needed')]:
+        save = commands.add_parser(name, help=help)
+        save.add_argument('list')
+        save.set_defaults(run=run_save)
+        batch_commands.append(save)
+
+    delete = commands.add_parser('delete', help='delete books with IDs read from stdin from a list')
+    delete.add_argument('list')
+    delete.set_defaults(run=run_delete)
+    batch_commands.append(delete)
+
+    move = commands.add_parser('move', help='move books with IDs read from stdin to another list')
+    move.add_argument('list')
+    move.add_argument('target')
+    move.set_defaults(run=run_move)
+    batch_commands.append(move)
+
+    export = commands.add_parser('export', help='write books in lists, or in all lists, one per line')
+    export.add_argument('lists', nargs='*')
+    export.set_defaults(run=run_export)
+
+    covers = commands.add_parser('covers', help='download cover thumbnails for books in a list, or read from stdin')
+    covers.add_argument('list', nargs='?')
+    covers.add_argument('--workers', type=int, default=COVER_WORKERS, help='maximum downloads in flight')
+    covers.add_argument('--cache-dir', default=COVER_DIR, help=f'directory covers are saved to (default: {COVER_DIR})')
+    covers.add_argument('--cache-size', type=int, default=COVER_CACHE_SIZE // (1024 * 1024),
+                        help='megabytes of covers kept before the least recently used are deleted')
+    covers.set_defaults(run=run_covers)
+
+    for command in batch_commands:
+        command.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='records written to the list at a time')
+    return parser
+
+def cli(argv, input=None, output=None):
+    '''Run batch command given by argv, or start interactive session if no command is given.
+
+    :param argv: Command line arguments, not including program name.
+    :type argv: list
+    :return: Exit status.
+    :rtype: int
+    '''
+    args = build_parser().parse_args(argv)
+    if args.profile or args.profile_output or PROFILE:
+        profiler.enable(args.profile_output or (PROFILE if PROFILE not in ['1', 'true'] else None))
+    if args.command is None:
+        if args.pause is not None:
+            terminal.pause_seconds = args.pause
+        if args.no_color:
+            terminal.color = False
+        if args.page_size:
+            terminal.page_size = args.page_size
+        with terminal.installed():
+            navigate()
+        return 0
+
+    status = args.run(args, input or sys.stdin, output or sys.stdout)
+    Search.session.close()
+    File.saved_index.write()
+    File.sort_index.write()
+    profiler.report()
+    return status
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(cli(sys.argv[1:]))